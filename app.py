@@ -1,20 +1,81 @@
+import functools
+import gzip
+import hashlib
 import json
+import mimetypes
+import operator
 import os
-
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from urllib.parse import urlencode
+
+import click
 from flasgger import Swagger
-from flask import Flask, Response, jsonify, request, send_from_directory
+from flask import (Flask, Response, abort, g, has_request_context, jsonify,
+                   request, stream_with_context)
 from flask_restful import Api, Resource
 from flask_sqlalchemy import SQLAlchemy
-from jsonschema import ValidationError, validate
-from sqlalchemy import UniqueConstraint, event
+from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+from sqlalchemy import (event, inspect, literal_column, select, text, tuple_,
+                        union_all)
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached, selectinload
 from werkzeug.routing import BaseConverter
 from werkzeug.exceptions import BadRequest
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import importer
+import metrics
+import migrations
+
 app = Flask(__name__, static_folder="static")
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///Database/bar.db"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["BAR_CACHE_SIZE"] = 1024
+app.config["RESPONSE_CACHE_SIZE"] = 512
+app.config["RESPONSE_CACHE_MAX_BODY"] = 256 * 1024
+app.config["PAGE_SIZE"] = 100
+app.config["MAX_PAGE_SIZE"] = 1000
+app.config["STREAM_BATCH_SIZE"] = 500
+app.config["MASON_ENCODER"] = "orjson" if orjson is not None else "json"
+app.config["COMPRESS_MIN_SIZE"] = 500
+app.config["COMPRESS_LEVEL"] = 6
+app.config["COMPRESS_BROTLI_QUALITY"] = 5
+app.config["SCHEMA_MAX_AGE"] = 7 * 24 * 60 * 60
+app.config["SQL_REPEAT_THRESHOLD"] = 5
+# most SQL statements a request to an endpoint may run, whatever the amount
+# of data, so that an N+1 query pattern shows up as a broken budget
+app.config["SQL_BUDGETS"] = {
+    "barcollection": {"GET": 4, "POST": 2},
+    "baritem": {"GET": 4, "PUT": 3, "DELETE": 9},
+    "tapdrinkcollection": {"GET": 3, "POST": 5},
+    "tapdrinkitem": {"GET": 3, "PUT": 4, "DELETE": 5},
+    "cocktailcollection": {"GET": 3, "POST": 5},
+    "cocktailitem": {"GET": 3, "PUT": 4, "DELETE": 5},
+    "barstats": {"GET": 7},
+    "drinkcollection": {"GET": 4},
+    "cataloguestats": {"GET": 7},
+    "searchresults": {"GET": 5},
+    "changefeed": {"GET": 4},
+    "cachestats": {"GET": 0},
+}
 app.config["SWAGGER"] = {
     "title": "Oulu Bars API",
     "openapi": "3.0.3",
@@ -30,6 +91,7 @@ LINK_RELATIONS_URL = "/alcoholmeta/link-relations/"
 BAR_PROFILE = "/profiles/bar/"
 TAPDRINK_PROFILE = "/profiles/tapdrink/"
 COCKTAIL_PROFILE = "/profiles/cocktail/"
+SCHEMA_URL = "/schemas/{}/"
 
 api = Api(app)
 db = SQLAlchemy(app)
@@ -47,15 +109,19 @@ class Bar(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
     address = db.Column(db.String(64), nullable=True)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     tapdrink = db.relationship(
         "Tapdrink",
         cascade="all, delete-orphan",
-        back_populates="bar")
+        back_populates="bar",
+        order_by="Tapdrink.id")
     cocktail = db.relationship(
         "Cocktail",
         cascade="all, delete-orphan",
-        back_populates="bar")
+        back_populates="bar",
+        order_by="Cocktail.id")
 
     def serialize(self):
         return {
@@ -97,12 +163,23 @@ class Tapdrink(db.Model):
     drink_name = db.Column(db.String(64), unique=False, nullable=False)
     drink_size = db.Column(db.Float, unique=False, nullable=False)
     price = db.Column(db.Float, unique=False, nullable=False)
-    table_args_ = (
-        UniqueConstraint(
-            'bar_name',
-            'drink_name',
-            'drink_size',
-            name='No duplicates in a bar'),
+    # maintained by SQLite, NULL for drinks without a size
+    price_per_litre = db.Column(db.Float, db.Computed("price / drink_size"))
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index(
+            "ix_tapdrink_lookup",
+            "bar_name",
+            "drink_name",
+            "drink_size",
+            unique=True),
+        db.Index("ix_tapdrink_page", "bar_name", "id"),
+        db.Index("ix_tapdrink_price", "price", "id"),
+        db.Index("ix_tapdrink_bar_price", "bar_name", "price", "id"),
+        db.Index("ix_tapdrink_type", "bar_name", "drink_type"),
+        db.Index("ix_tapdrink_value", "price_per_litre", "id"),
+        db.Index("ix_tapdrink_bar_value", "bar_name", "price_per_litre", "id"),
     )
     bar = db.relationship("Bar", back_populates="tapdrink")
 
@@ -112,7 +189,8 @@ class Tapdrink(db.Model):
             "drink_type": self.drink_type,
             "drink_name": self.drink_name,
             "drink_size": self.drink_size,
-            "price": self.price
+            "price": self.price,
+            "price_per_litre": self.price_per_litre
         }
 
     def deserialize(self, doc):
@@ -159,11 +237,17 @@ class Cocktail(db.Model):
             ondelete="CASCADE"))
     cocktail_name = db.Column(db.String(64), unique=False, nullable=False)
     price = db.Column(db.Float, nullable=False)
-    table_args_ = (
-        UniqueConstraint(
-            'bar_name',
-            'cocktail_name',
-            name='No duplicates in a bar'),
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index(
+            "ix_cocktail_lookup",
+            "bar_name",
+            "cocktail_name",
+            unique=True),
+        db.Index("ix_cocktail_page", "bar_name", "id"),
+        db.Index("ix_cocktail_price", "price", "id"),
+        db.Index("ix_cocktail_bar_price", "bar_name", "price", "id"),
     )
     bar = db.relationship("Bar", back_populates="cocktail")
 
@@ -203,6 +287,384 @@ class Cocktail(db.Model):
         return schema
 
 
+class VersionCounter(db.Model):
+    """
+    Change counters bumped by database triggers on every write, see
+    migrations.VERSION_TRIGGERS. Used as the source of the ETags.
+    """
+
+    key = db.Column(db.String(160), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+
+class Change(db.Model):
+    """
+    An entry of the change log written by database triggers, see
+    migrations.CHANGE_TRIGGERS. seq orders the entries in commit order and
+    is the token of the change feed. Entries of deleted rows carry a
+    tombstone with the natural key the row had.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = (
+        db.Index("ix_change_log_row", "kind", "row_id"),
+        {"sqlite_autoincrement": True},
+    )
+    seq = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    tombstone = db.Column(db.Text, nullable=True)
+    changed_at = db.Column(
+        db.DateTime, nullable=False,
+        server_default=db.func.current_timestamp())
+
+
+@event.listens_for(db.Model.metadata, "after_create")
+def create_triggers(target, connection, **kw):
+    for statement in migrations.SEARCH_TABLES + migrations.TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+class ValidatorRegistry:
+    """
+    Keeps the JSON schema of every registered model together with a validator
+    compiled for it. Schemas are built and checked once when the model is
+    registered, after that the request handlers share the same schema
+    objects, which must therefore not be modified. Mason controls refer to
+    the schemas by URL instead of embedding them, see send_schema.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._validators = {}
+        self._models = {}
+
+    def register(self, model):
+        schema = model.json_schema()
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        self._schemas[model] = schema
+        self._validators[model] = cls(schema)
+        self._models[model.__tablename__] = model
+
+    def schema(self, model):
+        return self._schemas[model]
+
+    def url(self, model):
+        return SCHEMA_URL.format(model.__tablename__)
+
+    def find(self, name):
+        """
+        Returns the model registered under a table name, or None.
+        """
+
+        return self._models.get(name)
+
+    def validate(self, model, doc):
+        """
+        Validates a document against the schema of a model.
+
+        : raises ValidationError: with the most relevant error, like
+            jsonschema.validate
+        """
+
+        error = best_match(self._validators[model].iter_errors(doc))
+        if error is not None:
+            raise error
+
+
+validators = ValidatorRegistry()
+validators.register(Bar)
+validators.register(Tapdrink)
+validators.register(Cocktail)
+
+
+class LRUCache:
+    """
+    A small thread safe least-recently-used cache. Lookups and insertions move
+    the key to the most recently used end and the least recently used entries
+    are evicted once maxsize is exceeded. Hits and misses are counted so that
+    the cache can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Drops every entry whose value matches the predicate.
+        """
+
+        with self._lock:
+            for key in [key for key, value in self._data.items()
+                        if predicate(value)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+bar_cache = LRUCache(app.config["BAR_CACHE_SIZE"])
+response_cache = LRUCache(app.config["RESPONSE_CACHE_SIZE"])
+
+
+def read_versions(keys):
+    """
+    Returns the version counters of the given keys, read with one primary key
+    lookup and remembered for the rest of the request, so that the bar cache
+    and the ETag of a request see the same versions.
+    """
+
+    versions = g.setdefault("versions", {})
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        versions.update(dict.fromkeys(missing, 0))
+        versions.update(
+            db.session.query(VersionCounter.key, VersionCounter.version).filter(
+                VersionCounter.key.in_(missing)))
+    return versions
+
+
+def _cache_bar(bar, version):
+    """
+    Stores the column values of a bar in the bar cache, keyed by its name,
+    together with the version of the bar they were read at. Plain values are
+    cached instead of the instance itself so that no ORM object is ever
+    shared between sessions.
+    """
+
+    values = {attr.key: getattr(bar, attr.key)
+              for attr in inspect(Bar).column_attrs}
+    bar_cache.set(bar.name, (version, values))
+
+
+def _cached_bar(name):
+    """
+    Returns a bar attached to the current session from the bar cache, or None
+    if the bar is not cached or has been written since it was cached. The
+    version counter is checked on every lookup, as the session events only
+    see the writes of this process and not those of other workers or of
+    direct SQL.
+    """
+
+    entry = bar_cache.get(name)
+    if entry is None:
+        return None
+    version, values = entry
+    if read_versions(["bar:" + name])["bar:" + name] != version:
+        bar_cache.invalidate(name)
+        return None
+    bar = Bar(**values)
+    make_transient_to_detached(bar)
+    return db.session.merge(bar, load=False)
+
+
+def _changed_bar_names(session):
+    names = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Bar):
+            names.add(obj.name)
+            names.update(inspect(obj).attrs.name.history.deleted)
+    return names
+
+
+def _changed_scopes(session):
+    """
+    Returns the version counter keys of everything the pending changes of a
+    session touch, mirroring the triggers in migrations.VERSION_TRIGGERS.
+    """
+
+    scopes = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Bar):
+            scopes.add("bars")
+            names = {obj.name, *inspect(obj).attrs.name.history.deleted}
+        elif isinstance(obj, (Tapdrink, Cocktail)):
+            names = {obj.bar_name, *inspect(obj).attrs.bar_name.history.deleted}
+        else:
+            continue
+        scopes.add("catalogue")
+        scopes.update("bar:" + name for name in names if name is not None)
+    return scopes
+
+
+@event.listens_for(db.session, "after_flush")
+def invalidate_bar_cache(session, flush_context):
+    """
+    Drops every bar touched by the flush from the bar cache, including the old
+    name of a renamed bar. The names are invalidated again after commit so
+    that a concurrent request cannot leave a pre-commit copy behind.
+    """
+
+    names = _changed_bar_names(session)
+    for name in names:
+        bar_cache.invalidate(name)
+    session.info.setdefault("stale_bars", set()).update(names)
+    session.info.setdefault("stale_scopes", set()).update(
+        _changed_scopes(session))
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_bar_cache_after_commit(session):
+    for name in session.info.pop("stale_bars", ()):
+        bar_cache.invalidate(name)
+    scopes = session.info.pop("stale_scopes", None)
+    if scopes:
+        response_cache.invalidate_where(
+            lambda entry: not scopes.isdisjoint(entry.scope))
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def forget_stale_bars(session, previous_transaction):
+    session.info.pop("stale_bars", None)
+    session.info.pop("stale_scopes", None)
+
+
+@event.listens_for(db.Model.metadata, "after_create")
+def clear_caches(target, connection, **kw):
+    """
+    A freshly created schema holds none of the cached rows.
+    """
+
+    bar_cache.clear()
+    response_cache.clear()
+
+
+registry = metrics.Registry()
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, until the response is returned to the "
+    "WSGI server.",
+    metrics.LATENCY_BUCKETS, ("endpoint", "method"))
+REQUESTS = registry.counter(
+    "http_requests_total", "Requests answered, by status code.",
+    ("endpoint", "method", "status"))
+RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes",
+    "Size of the response bodies as sent, after compression. Streamed "
+    "responses are not included.",
+    metrics.SIZE_BUCKETS, ("endpoint", "method"))
+REQUEST_STATEMENTS = registry.histogram(
+    "http_request_sql_statements",
+    "SQL statements run while handling a request.",
+    metrics.COUNT_BUCKETS, ("endpoint", "method"))
+STATEMENT_DURATION = registry.histogram(
+    "sql_statement_duration_seconds", "Time spent executing SQL statements.",
+    metrics.LATENCY_BUCKETS)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context,
+                          executemany):
+    context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    """
+    Times a statement and counts it for the current request, by its SQL text.
+    The parameters are bound separately, so the text is the same whenever the
+    same query is repeated for different rows.
+    """
+
+    STATEMENT_DURATION.observe(time.perf_counter() - context.metrics_started)
+    if has_request_context():
+        g.sql_statements = g.get("sql_statements", 0) + 1
+        if "sql_shapes" not in g:
+            g.sql_shapes = {}
+        g.sql_shapes[statement] = g.sql_shapes.get(statement, 0) + 1
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def check_queries(endpoint):
+    """
+    Logs the statements a request repeated SQL_REPEAT_THRESHOLD times or
+    more, the sign of a query run once per row, and checks the number of
+    statements against the budget of the endpoint in SQL_BUDGETS. A broken
+    budget is logged, and raised when testing so that it fails the test
+    suite like any other regression.
+
+    : raises QueryBudgetExceeded: if the budget is exceeded while testing
+    """
+
+    for statement, count in g.get("sql_shapes", {}).items():
+        if count >= app.config["SQL_REPEAT_THRESHOLD"]:
+            app.logger.warning(
+                "Possible N+1 query in %s %s, statement run %d times: %s",
+                request.method, endpoint, count, statement)
+    budget = app.config["SQL_BUDGETS"].get(endpoint, {}).get(request.method)
+    count = g.get("sql_statements", 0)
+    if budget is not None and count > budget:
+        message = (f"{request.method} {endpoint} ran {count} SQL statements, "
+                   f"its budget is {budget}")
+        if app.testing:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+
+
+@app.before_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    """
+    Records the latency, status and size of a response. Registered before
+    compress_response, so it runs after it and sees the encoded size.
+    """
+
+    elapsed = time.perf_counter() - g.get("metrics_started", time.perf_counter())
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_DURATION.observe(elapsed, endpoint, request.method)
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    REQUEST_STATEMENTS.observe(g.get("sql_statements", 0), endpoint,
+                               request.method)
+    check_queries(endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint, request.method)
+    return response
+
+
 class MasonBuilder(dict):
     """
     A convenience class from the PWP course material for managing dictionaries that represent Mason
@@ -273,6 +735,72 @@ class InventoryBuilder(MasonBuilder):
     from the PWP course material
     """
 
+    def add_control_pages(self, page):
+        """
+        Adds next and prev controls for a page returned by paginate.
+        """
+
+        if page.after is not None:
+            self.add_control(
+                "next",
+                page_href(limit=page.limit, after=page.after),
+                title="Next page"
+            )
+        if page.before is not None:
+            self.add_control(
+                "prev",
+                page_href(limit=page.limit, before=page.before),
+                title="Previous page"
+            )
+
+    def add_control_item_template(self, resource, **values):
+        """
+        Adds an href template of the items of a collection, from which
+        clients can build the URL of any item without a control per item.
+        """
+
+        self.add_control(
+            "almeta:item",
+            routes.template(resource, **values),
+            isHrefTemplate=True,
+            title="An item of this collection"
+        )
+
+    def add_control_offsets(self, limit, offset, has_next):
+        """
+        Adds next and prev controls for a page of a collection paginated with
+        ?limit= and ?offset=.
+        """
+
+        if has_next:
+            self.add_control(
+                "next",
+                page_href(limit=limit, offset=offset + limit),
+                title="Next page"
+            )
+        if offset > 0:
+            self.add_control(
+                "prev",
+                page_href(limit=limit, offset=max(offset - limit, 0)),
+                title="Previous page"
+            )
+
+    def add_embedded_menu(self, bar, embed):
+        """
+        Adds the requested child collections of a bar inline, using the same
+        item representation as the collection resources.
+
+        : param Bar bar: bar whose menu is embedded
+        : param set embed: names of the collections to embed
+        """
+
+        if "tapdrinks" in embed:
+            self["tapdrinks"] = [
+                tapdrink_item(bar, tapdrink) for tapdrink in bar.tapdrink]
+        if "cocktails" in embed:
+            self["cocktails"] = [
+                cocktail_item(bar, cocktail) for cocktail in bar.cocktail]
+
     def add_control_delete_bar(self, bar):
         self.add_control(
             "almeta:delete-bar",
@@ -287,7 +815,7 @@ class InventoryBuilder(MasonBuilder):
             api.url_for(BarCollection),
             method="POST",
             encoding="json",
-            schema=Bar.json_schema(),
+            schemaUrl=validators.url(Bar),
             title="Add a bar"
         )
 
@@ -297,7 +825,7 @@ class InventoryBuilder(MasonBuilder):
             api.url_for(BarItem, bar=bar),
             method="PUT",
             encoding="json",
-            schema=Bar.json_schema(),
+            schemaUrl=validators.url(Bar),
             title="Edit this bar"
 
         )
@@ -320,7 +848,7 @@ class InventoryBuilder(MasonBuilder):
             api.url_for(TapdrinkCollection, bar=bar),
             method="POST",
             encoding="json",
-            schema=Tapdrink.json_schema(),
+            schemaUrl=validators.url(Tapdrink),
             title="Add a tapdrink"
         )
 
@@ -334,7 +862,7 @@ class InventoryBuilder(MasonBuilder):
                 drink_size=drink_size),
             method="PUT",
             encoding="json",
-            schema=Tapdrink.json_schema(),
+            schemaUrl=validators.url(Tapdrink),
             title="Edit this tapdrink")
 
     def add_control_delete_cocktail(self, bar, cocktail_name):
@@ -351,7 +879,7 @@ class InventoryBuilder(MasonBuilder):
             api.url_for(CocktailCollection, bar=bar),
             method="POST",
             encoding="json",
-            schema=Cocktail.json_schema(),
+            schemaUrl=validators.url(Cocktail),
             title="Add a cocktail"
         )
 
@@ -361,36 +889,824 @@ class InventoryBuilder(MasonBuilder):
             api.url_for(CocktailItem, bar=bar, cocktail_name=cocktail_name),
             method="PUT",
             encoding="json",
-            schema=Cocktail.json_schema(),
+            schemaUrl=validators.url(Cocktail),
             title="Edit this cocktail"
         )
 
 
+Page = namedtuple("Page", ["items", "limit", "before", "after"])
+CachedResponse = namedtuple(
+    "CachedResponse", ["scope", "body", "headers", "encoded"])
+
+
+def page_args():
+    """
+    Parses the ?limit=, ?after= and ?before= query parameters of a collection
+    request. The limit defaults to PAGE_SIZE and is capped at MAX_PAGE_SIZE.
+
+    : return: tuple of (limit, after, before)
+    : raises ValueError: if a parameter is not a valid integer
+    """
+
+    limit = request.args.get("limit", app.config["PAGE_SIZE"], type=int)
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    for name in ("limit", "after", "before"):
+        if name in request.args and request.args.get(name, type=int) is None:
+            raise ValueError(f"{name} must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, app.config["MAX_PAGE_SIZE"]), after, before
+
+
+Sort = namedtuple("Sort", ["columns", "descending"])
+
+
+def _keyset(query, column, sort, key, forward):
+    """
+    Restricts a query to the rows following (forward) or preceding the row
+    whose unique column has the given value, in the order of the sort, and
+    orders it in that direction. For sorts on other columns the sort key of
+    the row is looked up first and compared as an SQL row value, which
+    SQLite resolves with a range search on the matching index.
+    """
+
+    if sort is None:
+        sort = Sort((column,), False)
+    ascending = forward != sort.descending
+    # a row without a value in a sort column, like the price per litre of a
+    # drink without a size, has no place in the order
+    query = query.filter(*(
+        sort_column.isnot(None) for sort_column in sort.columns
+        if sort_column.expression.nullable))
+    if key is not None:
+        if sort.columns == (column,):
+            values = (key,)
+        else:
+            values = query.session.query(*sort.columns).filter(
+                column == key).first()
+            if values is None:
+                raise ValueError(f"No item with key {key} to continue from")
+        left = tuple_(*sort.columns) if len(values) > 1 else sort.columns[0]
+        right = tuple_(*values) if len(values) > 1 else values[0]
+        query = query.filter(left > right if ascending else left < right)
+    return query.order_by(*(
+        sort_column if ascending else sort_column.desc()
+        for sort_column in sort.columns))
+
+
+def paginate(query, column, limit, after=None, before=None, sort=None):
+    """
+    Fetches one page of a query with keyset pagination on a unique, indexed
+    column. One row more than the limit is requested to find out whether
+    another page follows, so the database never returns more than limit + 1
+    rows regardless of the size of the table.
+
+    : param query: SQLAlchemy query of the collection
+    : param column: unique column the cursors of the pages refer to
+    : param int limit: maximum number of items on the page
+    : param int after: return items after this key
+    : param int before: return items before this key
+    : param Sort sort: order of the items if not by column, its columns must
+        identify a row
+    : return: Page
+    : raises ValueError: if a cursor refers to no row of a sorted query
+    """
+
+    if before is not None:
+        rows = _keyset(query, column, sort, before, False).limit(
+            limit + 1).all()
+        has_prev = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_next = True
+    else:
+        rows = _keyset(query, column, sort, after, True).limit(
+            limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = after is not None
+    key = column.key
+    return Page(
+        items=rows,
+        limit=limit,
+        before=getattr(rows[0], key) if rows and has_prev else None,
+        after=getattr(rows[-1], key) if rows and has_next else None,
+    )
+
+
+class RouteTemplates:
+    """
+    URL templates compiled once from the routes of the resources. Building an
+    item URL is then a str.format of the values converted with the route's
+    own converters, which gives the same URL as api.url_for without matching
+    the rules of the URL map on every call. The templates are also published
+    as RFC 6570 href templates in Mason controls.
+    """
+
+    VARIABLE = re.compile(r"<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>")
+
+    def __init__(self, url_map):
+        self.url_map = url_map
+        self._compiled = {}
+
+    def compile(self, resource):
+        """
+        Returns the format string of the route of a resource and the
+        converter of every variable in it.
+        """
+
+        compiled = self._compiled.get(resource)
+        if compiled is None:
+            rule = next(self.url_map.iter_rules(resource.endpoint)).rule
+            converters = {}
+
+            def variable(match):
+                converter, name = match.group(1) or "default", match.group(2)
+                converters[name] = self.url_map.converters[converter](
+                    self.url_map)
+                return "{" + name + "}"
+
+            path = self.VARIABLE.sub(
+                variable, rule.replace("{", "{{").replace("}", "}}"))
+            compiled = self._compiled[resource] = (path, converters)
+        return compiled
+
+    def build(self, resource, **values):
+        """
+        Builds the URL of a resource, like api.url_for.
+        """
+
+        path, converters = self.compile(resource)
+        return request.script_root + path.format(**{
+            name: converter.to_url(values[name])
+            for name, converter in converters.items()
+        })
+
+    def template(self, resource, **values):
+        """
+        Builds an href template of a resource with the given variables
+        filled in and the others left as {name}.
+        """
+
+        path, converters = self.compile(resource)
+        return request.script_root + path.format(**{
+            name: converter.to_url(values[name]) if name in values
+            else "{" + name + "}"
+            for name, converter in converters.items()
+        })
+
+
+routes = RouteTemplates(app.url_map)
+
+
+def self_href():
+    """
+    Returns the URL of the current request including its query string, so
+    that the self control of a filtered or sorted collection leads back to
+    the same view.
+    """
+
+    if request.query_string:
+        return request.path + "?" + request.query_string.decode()
+    return request.path
+
+
+def page_href(**params):
+    """
+    Builds a link to the current collection keeping the query string of the
+    request, except for the pagination parameters which are replaced.
+    """
+
+    args = {key: value for key, value in request.args.items()
+            if key not in ("limit", "after", "before")}
+    args.update(params)
+    return request.path + "?" + urlencode(args)
+
+
+# Query parameters filtering the menu collections, mapped to the column, the
+# comparison and the type of the value for every model they apply to.
+COLLECTION_FILTERS = {
+    Tapdrink: {
+        "drink_type": (Tapdrink.drink_type, operator.eq, str),
+        "min_price": (Tapdrink.price, operator.ge, float),
+        "max_price": (Tapdrink.price, operator.le, float),
+        "max_size": (Tapdrink.drink_size, operator.le, float),
+        "min_price_per_litre": (Tapdrink.price_per_litre, operator.ge, float),
+        "max_price_per_litre": (Tapdrink.price_per_litre, operator.le, float),
+    },
+    Cocktail: {
+        "min_price": (Cocktail.price, operator.ge, float),
+        "max_price": (Cocktail.price, operator.le, float),
+    },
+}
+
+# ?sort= keys of the menu collections. The columns of every sort identify a
+# row within a bar and are covered by an index starting with bar_name.
+COLLECTION_SORTS = {
+    Tapdrink: {
+        "price": (Tapdrink.price, Tapdrink.id),
+        "name": (Tapdrink.drink_name, Tapdrink.drink_size),
+        "price_per_litre": (Tapdrink.price_per_litre, Tapdrink.id),
+    },
+    Cocktail: {
+        "price": (Cocktail.price, Cocktail.id),
+        "name": (Cocktail.cocktail_name,),
+    },
+}
+
+
+def filter_collection(model, query):
+    """
+    Applies the whitelisted filter parameters of the request to the query
+    of a collection. Parameters that do not apply to the model are ignored.
+
+    : raises ValueError: if a filter value has the wrong type
+    """
+
+    for name, (column, compare, kind) in COLLECTION_FILTERS[model].items():
+        if name not in request.args:
+            continue
+        value = request.args.get(name, type=kind)
+        if value is None:
+            raise ValueError(f"{name} must be a {kind.__name__}")
+        query = query.filter(compare(column, value))
+    return query
+
+
+def sort_arg(model):
+    """
+    Parses the ?sort= query parameter of a collection, a key of
+    COLLECTION_SORTS optionally prefixed with - for descending order.
+
+    : return: Sort or None for the default order
+    : raises ValueError: if the sort key is not known
+    """
+
+    key = request.args.get("sort")
+    if key is None:
+        return None
+    sorts = COLLECTION_SORTS[model]
+    columns = sorts.get(key.lstrip("-"))
+    if columns is None or key.startswith("--"):
+        raise ValueError("sort must be one of " + ", ".join(
+            f"{name}, -{name}" for name in sorts))
+    return Sort(columns, key.startswith("-"))
+
+
+def offset_arg():
+    """
+    Parses the ?offset= query parameter of a ranked collection.
+
+    : raises ValueError: if the offset is not a non-negative integer
+    """
+
+    offset = request.args.get("offset", 0, type=int)
+    if "offset" in request.args and request.args.get("offset", type=int) is None:
+        raise ValueError("offset must be an integer")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    return offset
+
+
+def embed_args():
+    """
+    Parses the comma separated ?embed= query parameter of a bar request.
+
+    : return: set of the names of the child collections to embed
+    : raises ValueError: if an unknown collection is requested
+    """
+
+    value = request.args.get("embed", "")
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(EMBEDDABLE)
+    if unknown:
+        raise ValueError(f"Cannot embed {', '.join(sorted(unknown))}")
+    return names
+
+
+def _encode_stdlib(data):
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_orjson(data):
+    return orjson.dumps(data)
+
+
+ENCODERS = {
+    "json": _encode_stdlib,
+    "orjson": _encode_orjson,
+}
+
+
+def encode_json(data):
+    """
+    Serializes a document to UTF-8 encoded JSON bytes with the encoder named
+    by the MASON_ENCODER setting. orjson is used when it is installed, the
+    standard library otherwise.
+    """
+
+    return ENCODERS[app.config["MASON_ENCODER"]](data)
+
+
+def lean_mode():
+    """
+    Tells whether the client asked for the lean representation without
+    hypermedia, with ?controls=none or by preferring application/json over
+    Mason in its Accept header. The resources and item builders check this
+    before building any control, so lean reads never call url_for.
+    """
+
+    if "lean" not in g:
+        g.lean = (request.args.get("controls") == "none"
+                  or request.accept_mimetypes.best_match([MASON, JSON]) == JSON)
+    return g.lean
+
+
+def lean_body(data):
+    """
+    Returns the lean representation of a document and the Link header
+    carrying its next and prev controls. In lean mode the resources build no
+    other controls, so only the envelope has any to remove. A plain
+    collection becomes the array of its items.
+    """
+
+    controls = data.pop("@controls", {})
+    links = ", ".join(
+        f'<{controls[rel]["href"]}>; rel="{rel}"'
+        for rel in ("next", "prev") if rel in controls)
+    if set(data) == {"items"}:
+        data = data["items"]
+    return data, links
+
+
+def mason_response(data, status=200, headers=None):
+    """
+    Returns a Mason response whose body is written as bytes without an
+    intermediate string. Successful responses to lean requests are plain
+    JSON without hypermedia instead.
+    """
+
+    if status < 400 and lean_mode():
+        data, links = lean_body(data)
+        response = Response(encode_json(data), status, headers=headers,
+                            mimetype=JSON)
+        if links:
+            response.headers["Link"] = links
+    else:
+        response = Response(encode_json(data), status, headers=headers,
+                            mimetype=MASON)
+    response.vary.add("Accept")
+    return response
+
+
+COMPRESSIBLE = {MASON, JSON, "application/javascript", "image/svg+xml"}
+
+
+def content_encodings():
+    """
+    Returns the content codings this server can produce, preferred first.
+    """
+
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding():
+    """
+    Picks the content coding for the response from the Accept-Encoding
+    header of the request, or None if the body should be sent as is.
+    """
+
+    accepted = request.accept_encodings
+    encoding = max(content_encodings(), key=lambda name: accepted[name],
+                   default=None)
+    if encoding is None or not accepted[encoding]:
+        return None
+    return encoding
+
+
+def compress(body, encoding):
+    """
+    Compresses a whole body with gzip or brotli at the configured level.
+    """
+
+    if encoding == "br":
+        return brotli.compress(
+            body, quality=app.config["COMPRESS_BROTLI_QUALITY"])
+    return gzip.compress(
+        body, compresslevel=app.config["COMPRESS_LEVEL"], mtime=0)
+
+
+def _compress_stream(chunks, encoding):
+    """
+    Compresses a streamed body chunk by chunk, flushing after every chunk so
+    the client receives each batch as soon as it is produced.
+    """
+
+    if encoding == "br":
+        compressor = brotli.Compressor(
+            quality=app.config["COMPRESS_BROTLI_QUALITY"])
+        process, flush, finish = (
+            compressor.process, compressor.flush, compressor.finish)
+    else:
+        compressor = zlib.compressobj(
+            app.config["COMPRESS_LEVEL"], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+    for chunk in chunks:
+        yield process(chunk) + flush()
+    yield finish()
+
+
+def encoded_response(response, body, encoding):
+    """
+    Turns a response into the given content coding of its representation.
+    The ETag of a coded representation gets the coding as suffix, as it is a
+    different sequence of bytes than the identity one.
+    """
+
+    if body is not None:
+        response.set_data(body)
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def etag_variants(etag):
+    """
+    Lists the ETags of every content coding of a representation.
+    """
+
+    return [etag] + [f"{etag}-{encoding}" for encoding in ("br", "gzip")]
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compresses Mason, JSON and text responses with gzip, or brotli when it
+    is installed, as negotiated through Accept-Encoding. Bodies below
+    COMPRESS_MIN_SIZE are not worth the overhead and are sent as is, as are
+    file downloads and responses that already have a content coding.
+    """
+
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype in COMPRESSIBLE
+                    or response.mimetype.startswith("text/"))):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+        return encoded_response(response, None, encoding)
+    body = response.get_data()
+    if len(body) < app.config["COMPRESS_MIN_SIZE"]:
+        return response
+    return encoded_response(response, compress(body, encoding), encoding)
+
+
+def stream_args():
+    """
+    Tells whether the client asked for the whole collection as a stream with
+    ?stream=true instead of a single page.
+    """
+
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def stream_collection(body, query, column, after, build_item, sort=None):
+    """
+    Returns a streamed Mason response containing every item of a collection
+    after the given key. The envelope is encoded once and split around the
+    items array, the rows are read from the cursor STREAM_BATCH_SIZE at a
+    time with yield_per and each batch of encoded items is sent as soon as it
+    is ready. Peak memory therefore stays at one batch and the first bytes
+    go out before the query has finished.
+
+    : param InventoryBuilder body: the collection envelope without items
+    : param query: SQLAlchemy query of the collection
+    : param column: unique column the items are ordered by
+    : param int after: only stream items after this key
+    : param build_item: callable building the representation of a row
+    : param Sort sort: order of the items if not by column
+    : raises ValueError: if after refers to no row of a sorted query
+    """
+
+    if lean_mode():
+        head, tail, mimetype = b"[", b"]", JSON
+    else:
+        marker = uuid.uuid4().hex
+        body["items"] = [marker]
+        head, tail = encode_json(body).split(encode_json(marker))
+        mimetype = MASON
+    query = _keyset(query, column, sort, after, True)
+    batch_size = app.config["STREAM_BATCH_SIZE"]
+
+    def generate():
+        yield head
+        separator = b""
+        chunk = []
+        for row in query.yield_per(batch_size):
+            chunk.append(encode_json(build_item(row)))
+            if len(chunk) >= batch_size:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk = []
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield tail
+
+    response = Response(stream_with_context(generate()), 200, mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+
+def current_etag(keys):
+    """
+    Builds an ETag from the version counters of the given keys with one
+    primary key lookup, without touching the data itself.
+    """
+
+    versions = read_versions(keys)
+    return "-".join(f"{key}:{versions[key]}" for key in keys)
+
+
+def response_cache_key(etag):
+    return request.full_path, request.headers.get("Accept", ""), etag
+
+
+def conditional(scope):
+    """
+    Decorator for resource GET methods adding a strong ETag and answering a
+    matching If-None-Match with 304 before the method runs, so an unchanged
+    resource costs a single counter lookup.
+
+    Encoded 200 bodies are kept in the response cache keyed by the URL, the
+    Accept header and the ETag. A cached body is therefore only found while
+    its ETag is current, so writes that bypass the ORM, like imports or other
+    worker processes, are never answered from a stale entry, as long as the
+    method builds the body from data at least as new as the ETag. The bar
+    cache, which the bar converter reads from, checks the same counters for
+    this reason. Commits through the session
+    additionally evict the entries of the scopes they touch right away.
+
+    : param scope: callable receiving the keyword arguments of the method and
+        returning the version counter keys the representation depends on
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if type(kwargs.get("bar")) == Response:  # if converter returns error
+                return method(self, *args, **kwargs)
+            keys = scope(**kwargs)
+            etag = current_etag(keys)
+            if lean_mode():
+                etag += "-lean"
+            for variant in etag_variants(etag):
+                if request.if_none_match.contains(variant):
+                    response = Response(status=304)
+                    response.set_etag(variant)
+                    # a 304 repeats the Vary of the 200 it stands for
+                    response.vary.update(("Accept", "Accept-Encoding"))
+                    return response
+            key = response_cache_key(etag)
+            cached = response_cache.get(key)
+            if cached is not None:
+                response = Response(
+                    cached.body, mimetype=JSON if lean_mode() else MASON)
+                response.headers.update(cached.headers)
+                response.set_etag(etag)
+                response.headers["X-Cache"] = "HIT"
+                # hits are compressed once per coding, not once per request
+                encoding = negotiate_encoding()
+                if (encoding is not None and len(cached.body)
+                        >= app.config["COMPRESS_MIN_SIZE"]):
+                    if encoding not in cached.encoded:
+                        cached.encoded[encoding] = compress(
+                            cached.body, encoding)
+                    encoded_response(
+                        response, cached.encoded[encoding], encoding)
+                return response
+            response = method(self, *args, **kwargs)
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers["X-Cache"] = "MISS"
+                if (not response.is_streamed
+                        and response.content_length
+                        <= app.config["RESPONSE_CACHE_MAX_BODY"]):
+                    headers = {name: response.headers[name]
+                               for name in ("Link", "Vary")
+                               if name in response.headers}
+                    response_cache.set(key, CachedResponse(
+                        frozenset(keys), response.get_data(), headers, {}))
+            return response
+        return wrapper
+    return decorator
+
+
+def bar_scope(bar, **kwargs):
+    return ("bar:" + bar.name,)
+
+
 def create_error_response(status_code, title, message=None):
     resource_url = request.path
     data = MasonBuilder(resource_url=resource_url)
     data.add_error(title, message)
     data.add_control("profile", href=ERROR_PROFILE)
-    return Response(json.dumps(data), status_code, mimetype=MASON)
+    return mason_response(data, status_code)
 
 
-class BarCollection(Resource):
+EMBEDDABLE = {
+    "tapdrinks": Bar.tapdrink,
+    "cocktails": Bar.cocktail,
+}
 
-    def get(self):
-        body = InventoryBuilder(items=[])
-        body.add_namespace("almeta", LINK_RELATIONS_URL)
-        body.add_control("self", href=request.path)
-        body.add_control_add_bar()
 
-        for bar in Bar.query.all():
-            item = InventoryBuilder({
-                "name": bar.name,
-                "address": bar.address
+def bar_item(bar, embed):
+    """
+    Builds the collection representation of a bar, with the requested child
+    collections embedded.
+    """
+
+    item = InventoryBuilder({
+        "name": bar.name,
+        "address": bar.address
+    })
+    if not lean_mode():
+        item.add_control("self", href=routes.build(BarItem, bar=bar))
+    item.add_embedded_menu(bar, embed)
+    return item
+
+
+def tapdrink_item(bar, tapdrink):
+    """
+    Builds the collection representation of a tapdrink.
+    """
+
+    item = InventoryBuilder(
+        {
+            "bar_name": tapdrink.bar_name,
+            "drink_type": tapdrink.drink_type,
+            "drink_name": tapdrink.drink_name,
+            "drink_size": tapdrink.drink_size,
+            "price": tapdrink.price,
+            "price_per_litre": tapdrink.price_per_litre
+        }
+    )
+    if lean_mode():
+        return item
+    item.add_control(
+        "self",
+        href=routes.build(
+            TapdrinkItem,
+            bar=bar,
+            drink_name=tapdrink.drink_name,
+            drink_size=tapdrink.drink_size))
+    return item
+
+
+def cocktail_item(bar, cocktail):
+    """
+    Builds the collection representation of a cocktail.
+    """
+
+    item = InventoryBuilder(
+        {
+            "bar_name": cocktail.bar_name,
+            "cocktail_name": cocktail.cocktail_name,
+            "price": cocktail.price
+        }
+    )
+    if lean_mode():
+        return item
+    item.add_control(
+        "self",
+        href=routes.build(
+            CocktailItem,
+            bar=bar,
+            cocktail_name=cocktail.cocktail_name))
+    return item
+
+
+def bulk_create(bar, model, docs, key, item_url):
+    """
+    Creates a batch of menu items for a bar with a single executemany INSERT
+    in one transaction. Every document is validated first and the batch is
+    only written if all of them are acceptable, otherwise nothing is
+    inserted. The response reports the status of every element in the order
+    they were sent: 201 with a self control for created items, 400 or 409
+    with a message for rejected ones and 424 for valid items that were not
+    inserted because another element was rejected.
+
+    : param Bar bar: the bar from the URL
+    : param model: Tapdrink or Cocktail
+    : param list docs: the JSON documents of the request
+    : param tuple key: names of the columns that identify an item in a bar
+    : param item_url: callable building the item URL from a document
+    """
+
+    if type(bar) == Response:
+        return bar
+    results = []
+    keys = {}
+    for index, doc in enumerate(docs):
+        try:
+            validators.validate(model, doc)
+        except ValidationError as e:
+            results.append({"status": 400, "message": e.message})
+            continue
+        if doc["bar_name"] != bar.name:
+            results.append({
+                "status": 400,
+                "message": "bar_name does not match the bar in the URL"
             })
-            item.add_control("self", href=api.url_for(BarItem, bar=bar))
-            body["items"].append(item)
+            continue
+        doc_key = tuple(doc[column] for column in key)
+        if doc_key in keys:
+            results.append({"status": 409, "message": "Duplicate in request"})
+            continue
+        keys[doc_key] = index
+        results.append(None)
+
+    if keys:
+        columns = [getattr(model, column) for column in key]
+        existing = db.session.query(*columns).filter(
+            tuple_(*columns).in_(list(keys))).all()
+        for row in existing:
+            results[keys[tuple(row)]] = {
+                "status": 409,
+                "message": "Already exists"
+            }
+
+    failed = [result for result in results if result is not None]
+    if not docs or failed:
+        status = 400 if not docs or any(
+            result["status"] == 400 for result in failed) else 409
+        body = MasonBuilder(resource_url=request.path)
+        body.add_error(
+            "Invalid JSON document" if status == 400 else "Conflict",
+            f"{len(failed)} of {len(docs)} items were rejected")
+        body.add_control("profile", href=ERROR_PROFILE)
+        body["items"] = [
+            result or {"status": 424, "message": "Not created"}
+            for result in results
+        ]
+        return mason_response(body, status)
+
+    rows = [importer.row_values(model, doc) for doc in docs]
+    try:
+        db.session.execute(model.__table__.insert(), rows)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return create_error_response(500, "Database error")
 
-        return Response(json.dumps(body), 200, mimetype=MASON)
+    body = MasonBuilder(items=[])
+    for doc in docs:
+        item = MasonBuilder(status=201)
+        if not lean_mode():
+            item.add_control("self", href=item_url(doc))
+        body["items"].append(item)
+    return mason_response(body, 201)
+
+
+class BarCollection(Resource):
+
+    @conditional(lambda: ("catalogue",) if request.args.get("embed") else ("bars",))
+    def get(self):
+        body = InventoryBuilder(items=[])
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=request.path)
+            body.add_control_add_bar()
+            body.add_control_item_template(BarItem)
+        try:
+            limit, after, before = page_args()
+            embed = embed_args()
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+        # load the embedded menus of the whole page with one query each
+        query = Bar.query.options(
+            *(selectinload(EMBEDDABLE[name]) for name in embed))
+        if stream_args():
+            return stream_collection(
+                body, query, Bar.id, after, lambda bar: bar_item(bar, embed))
+        page = paginate(query, Bar.id, limit, after, before)
+        body.add_control_pages(page)
+
+        for bar in page.items:
+            body["items"].append(bar_item(bar, embed))
+
+        return mason_response(body)
 
     def post(self):
         try:
@@ -398,7 +1714,7 @@ class BarCollection(Resource):
         except BadRequest:
             return create_error_response(415, "Unsupported media type", "Use JSON")
         try:
-            validate(request.json, Bar.json_schema())
+            validators.validate(Bar, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document")
 
@@ -419,10 +1735,18 @@ class BarCollection(Resource):
 
 class BarItem(Resource):
 
+    @conditional(bar_scope)
     def get(self, bar):
         if type(bar) == Response:  # if converter returns error
             return bar
+        try:
+            embed = embed_args()
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
         body = InventoryBuilder(bar.serialize())
+        body.add_embedded_menu(bar, embed)
+        if lean_mode():
+            return mason_response(body)
         body.add_control("self", href=api.url_for(BarItem, bar=bar))
         body.add_control_edit_bar(bar)
         body.add_control_delete_bar(bar)
@@ -433,8 +1757,10 @@ class BarItem(Resource):
                          href=api.url_for(TapdrinkCollection, bar=bar))
         body.add_control("almeta:cocktails-in",
                          href=api.url_for(CocktailCollection, bar=bar))
+        body.add_control("almeta:stats-of",
+                         href=api.url_for(BarStats, bar=bar))
 
-        return Response(json.dumps(body), 200, mimetype=MASON)
+        return mason_response(body)
 
     def put(self, bar):
         try:
@@ -442,7 +1768,7 @@ class BarItem(Resource):
         except BadRequest:
             return create_error_response(415, "Unsupported media type", "Use JSON")
         try:
-            validate(request.json, Bar.json_schema())
+            validators.validate(Bar, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document", str(e))
         if type(bar) == Response:
@@ -468,33 +1794,33 @@ class BarItem(Resource):
 
 class TapdrinkCollection(Resource):
 
+    @conditional(bar_scope)
     def get(self, bar):
         body = InventoryBuilder(items=[])
-        body.add_namespace("almeta", LINK_RELATIONS_URL)
-        body.add_control("self", href=request.path)
-        body.add_control_add_tapdrink(bar)
-        body.add_control("author", href=api.url_for(BarItem, bar=bar))
-
-        for tapdrink in Tapdrink.query.filter_by(bar_name=bar.name).all():
-            item = InventoryBuilder(
-                {
-                    "bar_name": tapdrink.bar_name,
-                    "drink_type": tapdrink.drink_type,
-                    "drink_name": tapdrink.drink_name,
-                    "drink_size": tapdrink.drink_size,
-                    "price": tapdrink.price
-                }
-            )
-            item.add_control(
-                "self",
-                href=api.url_for(
-                    TapdrinkItem,
-                    bar=bar,
-                    drink_name=tapdrink.drink_name,
-                    drink_size=tapdrink.drink_size))
-            body["items"].append(item)
-
-        return Response(json.dumps(body), 200, mimetype=MASON)
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=self_href())
+            body.add_control_add_tapdrink(bar)
+            body.add_control("author", href=api.url_for(BarItem, bar=bar))
+            body.add_control_item_template(TapdrinkItem, bar=bar)
+        try:
+            limit, after, before = page_args()
+            query = filter_collection(
+                Tapdrink, Tapdrink.query.filter_by(bar_name=bar.name))
+            sort = sort_arg(Tapdrink)
+            if stream_args():
+                return stream_collection(
+                    body, query, Tapdrink.id, after,
+                    lambda tapdrink: tapdrink_item(bar, tapdrink), sort)
+            page = paginate(query, Tapdrink.id, limit, after, before, sort)
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+        body.add_control_pages(page)
+
+        for tapdrink in page.items:
+            body["items"].append(tapdrink_item(bar, tapdrink))
+
+        return mason_response(body)
 
     def post(self, bar=None):
         try:
@@ -502,8 +1828,18 @@ class TapdrinkCollection(Resource):
         except BadRequest:
             return create_error_response(415, "Unsupported media type", "Use JSON")
 
+        if isinstance(request.json, list):
+            return bulk_create(
+                bar, Tapdrink, request.json,
+                ("bar_name", "drink_name", "drink_size"),
+                lambda doc: routes.build(
+                    TapdrinkItem,
+                    bar=bar,
+                    drink_name=doc["drink_name"],
+                    drink_size=doc["drink_size"]))
+
         try:
-            validate(request.json, Tapdrink.json_schema())
+            validators.validate(Tapdrink, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document", str(e))
 
@@ -522,6 +1858,7 @@ class TapdrinkCollection(Resource):
 
 class TapdrinkItem(Resource):
 
+    @conditional(bar_scope)
     def get(self, bar, drink_name, drink_size):
         tapdrink = Tapdrink.query.filter_by(
             bar_name=bar.name,
@@ -530,6 +1867,8 @@ class TapdrinkItem(Resource):
         if not tapdrink:
             return create_error_response(404, "Tapdrink not found")
         body = InventoryBuilder(tapdrink.serialize())
+        if lean_mode():
+            return mason_response(body)
         body.add_control(
             "self",
             href=api.url_for(
@@ -550,7 +1889,7 @@ class TapdrinkItem(Resource):
         body.add_namespace("almeta", LINK_RELATIONS_URL)
         body.add_namespace("profile", TAPDRINK_PROFILE)
 
-        return Response(json.dumps(body), 200, mimetype=MASON)
+        return mason_response(body)
 
     def put(self, bar, drink_name, drink_size):
         try:
@@ -558,7 +1897,7 @@ class TapdrinkItem(Resource):
         except BadRequest:
             return create_error_response(415, "Unsupported media type", "Use JSON")
         try:
-            validate(request.json, Tapdrink.json_schema())
+            validators.validate(Tapdrink, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document", str(e))
 
@@ -591,30 +1930,33 @@ class TapdrinkItem(Resource):
 
 
 class CocktailCollection(Resource):
+    @conditional(bar_scope)
     def get(self, bar):
         body = InventoryBuilder(items=[])
-        body.add_namespace("almeta", LINK_RELATIONS_URL)
-        body.add_control("self", href=request.path)
-        body.add_control_add_cocktail(bar)
-        body.add_control("author", href=api.url_for(BarItem, bar=bar))
-
-        for cocktail in Cocktail.query.filter_by(bar_name=bar.name).all():
-            item = InventoryBuilder(
-                {
-                    "bar_name": cocktail.bar_name,
-                    "cocktail_name": cocktail.cocktail_name,
-                    "price": cocktail.price
-                }
-            )
-            item.add_control(
-                "self",
-                href=api.url_for(
-                    CocktailItem,
-                    bar=bar,
-                    cocktail_name=cocktail.cocktail_name))
-            body["items"].append(item)
-
-        return Response(json.dumps(body), 200, mimetype=MASON)
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=self_href())
+            body.add_control_add_cocktail(bar)
+            body.add_control("author", href=api.url_for(BarItem, bar=bar))
+            body.add_control_item_template(CocktailItem, bar=bar)
+        try:
+            limit, after, before = page_args()
+            query = filter_collection(
+                Cocktail, Cocktail.query.filter_by(bar_name=bar.name))
+            sort = sort_arg(Cocktail)
+            if stream_args():
+                return stream_collection(
+                    body, query, Cocktail.id, after,
+                    lambda cocktail: cocktail_item(bar, cocktail), sort)
+            page = paginate(query, Cocktail.id, limit, after, before, sort)
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+        body.add_control_pages(page)
+
+        for cocktail in page.items:
+            body["items"].append(cocktail_item(bar, cocktail))
+
+        return mason_response(body)
 
     def post(self, bar=None):
         try:
@@ -622,8 +1964,17 @@ class CocktailCollection(Resource):
         except BadRequest:
             return create_error_response(415, "Unsupported media type", "Use JSON")
 
+        if isinstance(request.json, list):
+            return bulk_create(
+                bar, Cocktail, request.json,
+                ("bar_name", "cocktail_name"),
+                lambda doc: routes.build(
+                    CocktailItem,
+                    bar=bar,
+                    cocktail_name=doc["cocktail_name"]))
+
         try:
-            validate(request.json, Cocktail.json_schema())
+            validators.validate(Cocktail, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document", str(e))
 
@@ -645,6 +1996,7 @@ class CocktailCollection(Resource):
 
 
 class CocktailItem(Resource):
+    @conditional(bar_scope)
     def get(self, bar, cocktail_name):
         cocktail = Cocktail.query.filter_by(
             bar_name=bar.name,
@@ -652,6 +2004,8 @@ class CocktailItem(Resource):
         if not cocktail:
             return create_error_response(404, "Cocktail not found")
         body = InventoryBuilder(cocktail.serialize())
+        if lean_mode():
+            return mason_response(body)
         body.add_namespace("almeta", LINK_RELATIONS_URL)
         body.add_namespace("profile", COCKTAIL_PROFILE)
         body.add_control(
@@ -669,7 +2023,7 @@ class CocktailItem(Resource):
         body.add_control("collection", href=api.url_for(
             CocktailCollection, bar=bar))
 
-        return Response(json.dumps(body), 200, mimetype=MASON)
+        return mason_response(body)
 
     def put(self, bar, cocktail_name):
         try:
@@ -678,7 +2032,7 @@ class CocktailItem(Resource):
             return create_error_response(415, "Unsupported media type", "Use JSON")
 
         try:
-            validate(request.json, Cocktail.json_schema())
+            validators.validate(Cocktail, request.json)
         except ValidationError as e:
             return create_error_response(400, "Invalid JSON document", str(e))
 
@@ -706,26 +2060,577 @@ class CocktailItem(Resource):
         return Response(status=204)
 
 
+PRECOMPRESSED_DIRECTORIES = ("profiles", "link-relations")
+StaticFile = namedtuple("StaticFile", ["variants", "etags", "mtime"])
+
+
+def precompress_static():
+    """
+    Reads the profile and link relation pages once and compresses each of
+    them with every supported coding at the highest level, so they are
+    served without any work per request.
+
+    : return: dict of path relative to the static folder -> StaticFile
+        with the bytes and the ETag of every coding (None for the identity)
+        and the modification time of the file
+    """
+
+    files = {}
+    for directory in PRECOMPRESSED_DIRECTORIES:
+        root = os.path.join(app.static_folder, directory)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            with open(path, "rb") as handle:
+                body = handle.read()
+            variants = {None: body}
+            variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variants["br"] = brotli.compress(body, quality=11)
+            # the codings get the suffix encoded_response gives them
+            etag = hashlib.sha1(body).hexdigest()
+            etags = {encoding: etag if encoding is None
+                     else f"{etag}-{encoding}" for encoding in variants}
+            files[f"{directory}/{name}"] = StaticFile(
+                variants, etags, int(os.path.getmtime(path)))
+    return files
+
+
+static_files = precompress_static()
+
+
+def send_precompressed(path):
+    """
+    Serves a file of the static folder from its pre-compressed variants,
+    revalidated with the ETag of the variant or the modification time.
+    """
+
+    static_file = static_files.get(path)
+    if static_file is None:
+        abort(404)
+    encoding = negotiate_encoding()
+    response = Response(static_file.variants[encoding],
+                        mimetype=mimetypes.guess_type(path)[0])
+    response.vary.add("Accept-Encoding")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(static_file.etags[encoding])
+    response.last_modified = static_file.mtime
+    return response.make_conditional(request)
+
+
+@app.route("/metrics")
+def send_metrics():
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/schemas/<name>/")
+def send_schema(name):
+    """
+    Serves the JSON schema of a model, which the add and edit controls link
+    to with schemaUrl. The schemas only change with a new release, so they
+    may be cached for SCHEMA_MAX_AGE and revalidated with their ETag.
+    """
+
+    model = validators.find(name)
+    if model is None:
+        abort(404)
+    body = encode_json(validators.schema(model))
+    response = Response(body, mimetype="application/schema+json")
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config["SCHEMA_MAX_AGE"]
+    return response.make_conditional(request)
+
+
 @app.route("/profiles/<resource>/")
 def send_profile_html(resource):
-    return send_from_directory(os.path.join(app.static_folder, "profiles"), f"{resource}.html")
+    return send_precompressed(f"profiles/{resource}.html")
 
 
 @app.route("/almeta/link-relations/")
 def send_link_relations_html():
-    returnable = send_from_directory(os.path.join(
-        app.static_folder, "link-relations"), "link-relations.html")
-    return send_from_directory(os.path.join(app.static_folder, "link-relations"), "link-relations.html")
+    return send_precompressed("link-relations/link-relations.html")
+
+
+def hot_queries():
+    """
+    The lookups run by the resources on every request, keyed by a short
+    description. Used to verify with EXPLAIN QUERY PLAN that each of them is
+    served by an index.
+    """
+
+    return {
+        "bar by name": Bar.query.filter_by(name="").statement,
+        "bar page": Bar.query.filter(Bar.id > 0).order_by(Bar.id).statement,
+        "tapdrink page": Tapdrink.query.filter_by(bar_name="").filter(
+            Tapdrink.id > 0).order_by(Tapdrink.id).statement,
+        "tapdrink page backwards": Tapdrink.query.filter_by(
+            bar_name="").filter(Tapdrink.id < 0).order_by(
+            Tapdrink.id.desc()).statement,
+        "tapdrink item": Tapdrink.query.filter_by(
+            bar_name="", drink_name="", drink_size=0).statement,
+        "cocktail page": Cocktail.query.filter_by(bar_name="").filter(
+            Cocktail.id > 0).order_by(Cocktail.id).statement,
+        "tapdrinks by price": Tapdrink.query.filter_by(bar_name="").filter(
+            Tapdrink.price <= 10.0,
+            tuple_(Tapdrink.price, Tapdrink.id) > tuple_(0.0, 0)).order_by(
+            Tapdrink.price, Tapdrink.id).statement,
+        "tapdrinks by name": Tapdrink.query.filter_by(bar_name="").filter(
+            tuple_(Tapdrink.drink_name, Tapdrink.drink_size)
+            < tuple_("", 0.0)).order_by(
+            Tapdrink.drink_name.desc(), Tapdrink.drink_size.desc()).statement,
+        "tapdrinks by value": Tapdrink.query.filter_by(bar_name="").filter(
+            Tapdrink.price_per_litre <= 10.0,
+            Tapdrink.price_per_litre.isnot(None),
+            tuple_(Tapdrink.price_per_litre, Tapdrink.id)
+            > tuple_(0.0, 0)).order_by(
+            Tapdrink.price_per_litre, Tapdrink.id).statement,
+        "cocktails by price": Cocktail.query.filter_by(bar_name="").filter(
+            tuple_(Cocktail.price, Cocktail.id) > tuple_(0.0, 0)).order_by(
+            Cocktail.price, Cocktail.id).statement,
+        "tapdrink types of a bar": db.session.query(
+            Tapdrink.drink_type, db.func.count()).filter(
+            Tapdrink.bar_name == "").group_by(Tapdrink.drink_type).statement,
+        "median cocktail price of a bar": Cocktail.query.with_entities(
+            Cocktail.price).filter(Cocktail.bar_name == "").order_by(
+            Cocktail.price).limit(2).offset(1).statement,
+        "cocktail page backwards": Cocktail.query.filter_by(
+            bar_name="").filter(Cocktail.id < 0).order_by(
+            Cocktail.id.desc()).statement,
+        "cheapest drinks": drinks_by_price(10, 0),
+        "cheapest drinks under a value": drinks_by_price(10, 0, 10.0),
+        "best value drinks": drinks_by_value(10, 0, 10.0),
+        "search": SEARCH_STATEMENT.bindparams(
+            query='"a"*', limit=10, offset=0),
+        "changes since": Change.query.filter(Change.seq > 0).order_by(
+            Change.seq).statement,
+        "version counters": VersionCounter.query.filter(
+            VersionCounter.key.in_(["", ""])).statement,
+        "cocktail item": Cocktail.query.filter_by(
+            bar_name="", cocktail_name="").statement,
+    }
+
+
+@app.cli.command("upgrade-db")
+def upgrade_db_command():
+    """
+    Creates missing tables and upgrades the database schema in place.
+    """
+
+    db.create_all()
+    applied = migrations.upgrade(db.engine, echo=click.echo)
+    if not applied:
+        click.echo("Database is up to date")
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """
+    Fails if any of the hot queries is not served by an index.
+    """
+
+    with db.engine.connect() as connection:
+        failures = migrations.check_query_plans(connection, hot_queries())
+    for name, steps in failures.items():
+        click.echo(f"{name}: {'; '.join(steps)}")
+    if failures:
+        raise SystemExit(1)
+    click.echo("All hot queries use an index")
+
+
+IMPORTABLE = {
+    "bars": Bar,
+    "tapdrinks": Tapdrink,
+    "cocktails": Cocktail,
+}
+
+
+@app.cli.command("import-data")
+@click.argument("kind", type=click.Choice(sorted(IMPORTABLE)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]),
+              help="File format, detected from the extension by default.")
+@click.option("--batch-size", default=1000, show_default=True,
+              type=click.IntRange(min=1), help="Rows per transaction.")
+@click.option("--checkpoint", type=click.Path(dir_okay=False),
+              help="Checkpoint file, defaults to PATH.checkpoint.")
+@click.option("--on-conflict", type=click.Choice(["fail", "ignore"]),
+              default="fail", show_default=True,
+              help="Stop at or skip rows that already exist.")
+def import_data_command(kind, path, fmt, batch_size, checkpoint, on_conflict):
+    """
+    Imports bars, tapdrinks or cocktails from a CSV or NDJSON file.
+
+    Bars have to be imported before their menus. An interrupted import is
+    resumed from its checkpoint when the command is run again.
+    """
+
+    checkpoint = checkpoint or path + ".checkpoint"
+    try:
+        stats = importer.import_file(
+            db.session, IMPORTABLE[kind], path, fmt=fmt,
+            batch_size=batch_size, checkpoint=checkpoint,
+            on_conflict=on_conflict, echo=click.echo)
+    except importer.ImportFailed as e:
+        raise click.ClickException(str(e))
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    for line, message in stats["errors"]:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(
+        f"Imported {stats['imported']} {kind}, skipped {stats['skipped']} "
+        f"already imported rows, rejected {stats['rejected']} invalid rows")
+    if stats["rejected"]:
+        raise SystemExit(1)
+
+
+ROW_MODELS = {
+    "bar": Bar,
+    "tapdrink": Tapdrink,
+    "cocktail": Cocktail,
+}
+
+
+def load_rows(refs):
+    """
+    Loads the rows behind a list of (kind, id) references with one IN query
+    per table. Rows that no longer exist are left out.
+
+    : return: dict of kind -> dict of id -> row
+    """
+
+    rows = {}
+    for kind, model in ROW_MODELS.items():
+        ids = [row_id for row_kind, row_id in refs if row_kind == kind]
+        if ids:
+            rows[kind] = {
+                row.id: row for row in model.query.filter(model.id.in_(ids))}
+    return rows
+
+
+def row_item(kind, row):
+    """
+    Builds the collection representation of a bar, tapdrink or cocktail.
+    """
+
+    if kind == "bar":
+        return bar_item(row, set())
+    if kind == "tapdrink":
+        return tapdrink_item(row.bar_name, row)
+    return cocktail_item(row.bar_name, row)
+
+
+def row_item_url(kind, row):
+    """
+    Builds the URL of the item resource of a bar, tapdrink or cocktail.
+    """
+
+    if kind == "bar":
+        return routes.build(BarItem, bar=row.name)
+    if kind == "tapdrink":
+        return routes.build(
+            TapdrinkItem,
+            bar=row.bar_name,
+            drink_name=row.drink_name,
+            drink_size=row.drink_size)
+    return routes.build(
+        CocktailItem, bar=row.bar_name, cocktail_name=row.cocktail_name)
+
+
+DRINK_SORTS = ("price", "price_per_litre")
+
+
+def drinks_by_price(limit, offset, max_price_per_litre=None):
+    """
+    Returns the (kind, id) rows of the cheapest tapdrinks and cocktails
+    together. Both sides of the UNION ALL are read in order from their price
+    index and merged by SQLite, which stops as soon as offset + limit rows
+    have been produced instead of sorting every drink in town. A price per
+    litre limit applies to the tapdrinks only, cocktails have no size.
+    """
+
+    tapdrinks = select(
+        literal_column("'tapdrink'").label("kind"), Tapdrink.id, Tapdrink.price)
+    if max_price_per_litre is not None:
+        tapdrinks = tapdrinks.filter(
+            Tapdrink.price_per_litre <= max_price_per_litre)
+    cocktails = select(
+        literal_column("'cocktail'").label("kind"), Cocktail.id, Cocktail.price)
+    return union_all(tapdrinks, cocktails).order_by(
+        "price", "id").limit(limit).offset(offset)
+
+
+def drinks_by_value(limit, offset, max_price_per_litre=None):
+    """
+    Returns the (kind, id) rows of the tapdrinks with the lowest price per
+    litre, read in order from their value index. Cocktails have no size and
+    are not ranked.
+    """
+
+    query = select(
+        literal_column("'tapdrink'").label("kind"), Tapdrink.id).filter(
+        Tapdrink.price_per_litre.isnot(None))
+    if max_price_per_litre is not None:
+        query = query.filter(Tapdrink.price_per_litre <= max_price_per_litre)
+    return query.order_by(
+        Tapdrink.price_per_litre, Tapdrink.id).limit(limit).offset(offset)
+
+
+class DrinkCollection(Resource):
+
+    @conditional(lambda: ("catalogue",))
+    def get(self):
+        try:
+            limit, _, _ = page_args()
+            offset = offset_arg()
+            sort = request.args.get("sort", "price")
+            if sort not in DRINK_SORTS:
+                raise ValueError("sort must be one of " + ", ".join(DRINK_SORTS))
+            max_price_per_litre = request.args.get("max_price_per_litre", type=float)
+            if "max_price_per_litre" in request.args and max_price_per_litre is None:
+                raise ValueError("max_price_per_litre must be a number")
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+
+        if sort == "price_per_litre":
+            statement = drinks_by_value(limit + 1, offset, max_price_per_litre)
+        else:
+            statement = drinks_by_price(limit + 1, offset, max_price_per_litre)
+        ranking = db.session.execute(statement).all()
+        has_next = len(ranking) > limit
+        ranking = ranking[:limit]
+        rows = load_rows([(entry.kind, entry.id) for entry in ranking])
+
+        body = InventoryBuilder(items=[])
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=self_href())
+        body.add_control_offsets(limit, offset, has_next)
+        for entry in ranking:
+            row = rows.get(entry.kind, {}).get(entry.id)
+            if row is None:  # deleted since the ranking was read
+                continue
+            body["items"].append(row_item(entry.kind, row))
+
+        return mason_response(body)
+
+
+SEARCH_STATEMENT = text(
+    "SELECT rowid FROM search_index WHERE search_index MATCH :query "
+    "ORDER BY rank LIMIT :limit OFFSET :offset")
+
+
+def search_query(terms):
+    """
+    Turns free text into an FTS5 query in which every word has to match the
+    beginning of a word in the index. The words are quoted so that FTS5
+    syntax in the input is searched for literally.
+    """
+
+    return " ".join(
+        '"' + word.replace('"', '""') + '"*' for word in terms.split())
+
+
+class SearchResults(Resource):
+
+    @conditional(lambda: ("catalogue",))
+    def get(self):
+        try:
+            limit, _, _ = page_args()
+            offset = offset_arg()
+            query = search_query(request.args.get("q", ""))
+            if not query:
+                raise ValueError("q must contain a search term")
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+
+        # the rowid of the search index encodes the kind and id of the row
+        kinds = migrations.SEARCH_KINDS
+        hits = [
+            (kinds[rowid % len(kinds)], rowid // len(kinds))
+            for rowid in db.session.execute(SEARCH_STATEMENT, {
+                "query": query, "limit": limit + 1, "offset": offset,
+            }).scalars()
+        ]
+        has_next = len(hits) > limit
+        hits = hits[:limit]
+        rows = load_rows(hits)
+
+        body = InventoryBuilder(items=[])
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=self_href())
+        body.add_control_offsets(limit, offset, has_next)
+        for kind, row_id in hits:
+            row = rows.get(kind, {}).get(row_id)
+            if row is None:  # deleted since the search was run
+                continue
+            body["items"].append(row_item(kind, row))
+
+        return mason_response(body)
+
+
+def price_stats(model, bar_name=None):
+    """
+    Computes the price statistics of the tapdrinks or cocktails of one bar,
+    or of every bar, in the database. Count, min, average and max are a
+    single aggregate query. The median is read by offset from the price
+    index, so at most two prices are fetched.
+
+    : param model: Tapdrink or Cocktail
+    : param str bar_name: bar to compute the statistics of, None for all
+    : return: dict of count and min, avg, median and max price
+    """
+
+    query = db.session.query(model.price)
+    if bar_name is not None:
+        query = query.filter(model.bar_name == bar_name)
+    count, low, mean, high = query.with_entities(
+        db.func.count(model.price), db.func.min(model.price),
+        db.func.avg(model.price), db.func.max(model.price)).one()
+    median = None
+    if count:
+        middle = query.order_by(model.price).limit(
+            2 - count % 2).offset((count - 1) // 2).all()
+        median = sum(price for price, in middle) / len(middle)
+    return {
+        "count": count,
+        "min_price": low,
+        "avg_price": round(mean, 2) if mean is not None else None,
+        "median_price": median,
+        "max_price": high,
+    }
+
+
+def type_counts(bar_name=None):
+    """
+    Counts the tapdrinks of one bar, or of every bar, per drink_type with a
+    GROUP BY.
+    """
+
+    query = db.session.query(Tapdrink.drink_type, db.func.count())
+    if bar_name is not None:
+        query = query.filter(Tapdrink.bar_name == bar_name)
+    return {
+        drink_type or "": count
+        for drink_type, count in query.group_by(Tapdrink.drink_type)
+    }
+
+
+def stats_body(bar_name=None):
+    body = InventoryBuilder(
+        tapdrinks=price_stats(Tapdrink, bar_name),
+        cocktails=price_stats(Cocktail, bar_name))
+    body["tapdrinks"]["by_type"] = type_counts(bar_name)
+    if not lean_mode():
+        body.add_namespace("almeta", LINK_RELATIONS_URL)
+        body.add_control("self", href=request.path)
+    return body
+
+
+class BarStats(Resource):
+
+    @conditional(bar_scope)
+    def get(self, bar):
+        if type(bar) == Response:  # if converter returns error
+            return bar
+        body = stats_body(bar.name)
+        if not lean_mode():
+            body.add_control("up", href=api.url_for(BarItem, bar=bar))
+            body.add_control(
+                "almeta:stats-all", href=api.url_for(CatalogueStats))
+        return mason_response(body)
+
+
+class CatalogueStats(Resource):
+
+    @conditional(lambda: ("catalogue",))
+    def get(self):
+        body = stats_body()
+        body["bars"] = Bar.query.count()
+        if not lean_mode():
+            body.add_control("collection", href=api.url_for(BarCollection))
+        return mason_response(body)
+
+
+class CacheStats(Resource):
+
+    def get(self):
+        body = MasonBuilder(
+            bars=bar_cache.stats(),
+            responses=response_cache.stats())
+        if not lean_mode():
+            body.add_control("self", href=request.path)
+        return mason_response(body)
+
+
+class ChangeFeed(Resource):
+
+    def get(self):
+        try:
+            limit, _, _ = page_args()
+            since = request.args.get("since", 0, type=int)
+            if "since" in request.args and request.args.get("since", type=int) is None:
+                raise ValueError("since must be an integer")
+        except ValueError as e:
+            return create_error_response(400, "Invalid query parameter", str(e))
+
+        changes = Change.query.filter(Change.seq > since).order_by(
+            Change.seq).limit(limit + 1).all()
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        # current state of the changed rows
+        rows = load_rows([(change.kind, change.row_id) for change in changes
+                          if change.tombstone is None])
+
+        token = changes[-1].seq if changes else since
+        body = InventoryBuilder(token=token, items=[])
+        if not lean_mode():
+            body.add_namespace("almeta", LINK_RELATIONS_URL)
+            body.add_control("self", href=self_href())
+        if has_more:
+            body.add_control("next", page_href(since=token, limit=limit),
+                             title="Next changes")
+        for change in changes:
+            item = InventoryBuilder(
+                seq=change.seq,
+                kind=change.kind,
+                changed_at=change.changed_at.isoformat())
+            if change.tombstone is not None:
+                item["operation"] = "delete"
+                item["data"] = json.loads(change.tombstone)
+            else:
+                row = rows.get(change.kind, {}).get(change.row_id)
+                if row is None:  # deleted later, its tombstone follows
+                    continue
+                item["operation"] = "upsert"
+                item["data"] = row.serialize()
+                item["data"]["updated_at"] = (
+                    row.updated_at.isoformat() if row.updated_at else None)
+                if not lean_mode():
+                    item.add_control(
+                        "self", href=row_item_url(change.kind, row))
+            body["items"].append(item)
+
+        return mason_response(body)
 
 
 class BarConverter(BaseConverter):
     def to_python(self, name):
+        db_bar = _cached_bar(name)
+        if db_bar is not None:
+            return db_bar
+        # the version is read first, a write in between only causes a miss
+        version = read_versions(["bar:" + name])["bar:" + name]
         db_bar = Bar.query.filter_by(name=name).first()
         if db_bar is None:
             return create_error_response(404, "Bar not found")
+        _cache_bar(db_bar, version)
         return db_bar
 
     def to_url(self, db_bar):
+        if isinstance(db_bar, str):
+            return db_bar
         return db_bar.name
 
 
@@ -740,3 +2645,9 @@ api.add_resource(
 api.add_resource(CocktailCollection, "/api/bars/<bar:bar>/cocktails/")
 api.add_resource(
     CocktailItem, "/api/bars/<bar:bar>/cocktails/<cocktail_name>/")
+api.add_resource(BarStats, "/api/bars/<bar:bar>/stats/")
+api.add_resource(DrinkCollection, "/api/drinks/")
+api.add_resource(CatalogueStats, "/api/stats/")
+api.add_resource(SearchResults, "/api/search/")
+api.add_resource(ChangeFeed, "/api/changes/")
+api.add_resource(CacheStats, "/api/cache/")
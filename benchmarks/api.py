@@ -0,0 +1,348 @@
+"""
+Measures the throughput of every resource of the API on synthetic datasets.
+
+For each dataset size a fresh SQLite database is filled through the models
+with bars and their menus, generated from a fixed seed so that every run
+measures the same data. Every endpoint is then driven through the Flask test
+client: first a timed pass reporting requests per second and the p50, p95
+and p99 latencies, then a shorter pass under tracemalloc reporting the peak
+memory allocated per request. Writes create, update and delete their own
+rows, so the dataset is the same for every endpoint.
+
+The results can be written as JSON and compared between commits, either
+with a plain diff or with --compare, which prints the change of throughput
+and p95 latency of every endpoint against an earlier result file.
+
+Usage:
+
+    python benchmarks/api.py [--bars 10 1000 100000] [--drinks 10]
+        [--cocktails 5] [--requests 200] [--trace 20] [--seed 2023]
+        [--endpoint PATTERN] [--no-response-cache] [--output results.json]
+        [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# add parent directory to path to import app (when running from the project root)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+from app import Bar, Cocktail, Tapdrink, app, bar_cache, db, response_cache  # nopep8
+
+DRINK_NAMES = ("Karhu", "Koff", "Lapin Kulta", "Olvi", "Sandels", "Karjala",
+               "Guinness", "Pilsner Urquell", "Heineken", "Brewdog Punk IPA")
+DRINK_TYPES = ("lager", "stout", "ipa", "cider", "long drink")
+DRINK_SIZES = (0.33, 0.4, 0.5)
+COCKTAIL_NAMES = ("Mojito", "Negroni", "Margarita", "Old Fashioned",
+                  "Cosmopolitan", "Daiquiri", "Manhattan", "Espresso Martini")
+
+BATCH_SIZE = 1000
+
+
+def bar_name(number):
+    return f"Bar-{number:06d}"
+
+
+def generate(bars, drinks, cocktails, seed):
+    """
+    Fills the database with the given number of bars, each with the given
+    number of tapdrinks and cocktails. Rows are added through the models in
+    batches of BATCH_SIZE bars per transaction.
+    """
+
+    rng = random.Random(seed)
+    for start in range(0, bars, BATCH_SIZE):
+        for number in range(start, min(start + BATCH_SIZE, bars)):
+            bar = Bar(name=bar_name(number),
+                      address=f"Isokatu {rng.randint(1, 120)}, Oulu")
+            db.session.add(bar)
+            for item in range(drinks):
+                db.session.add(Tapdrink(
+                    bar=bar,
+                    drink_type=rng.choice(DRINK_TYPES),
+                    drink_name=f"{rng.choice(DRINK_NAMES)} {item}",
+                    drink_size=rng.choice(DRINK_SIZES),
+                    price=round(rng.uniform(4, 12), 2)))
+            for item in range(cocktails):
+                db.session.add(Cocktail(
+                    bar=bar,
+                    cocktail_name=f"{rng.choice(COCKTAIL_NAMES)} {item}",
+                    price=round(rng.uniform(8, 18), 2)))
+        db.session.commit()
+    db.session.remove()
+
+
+def scenarios(bars, seed):
+    """
+    Returns the requests of every endpoint as (name, request) pairs, where
+    request builds the (method, path, json) of the i-th request. Reads pick
+    rows of the dataset, writes derive their rows from i, so the POST, PUT
+    and DELETE of the same endpoint operate on the same rows in turn.
+    """
+
+    def pick(i):
+        # the same i picks the same bar in every run
+        return bar_name(random.Random(f"{seed}-{i}").randrange(bars))
+
+    def existing_drink(i):
+        tapdrink = Tapdrink.query.filter_by(bar_name=pick(i)).first()
+        if tapdrink is None:
+            return f"/api/bars/{pick(i)}/tapdrinks/"
+        return (f"/api/bars/{tapdrink.bar_name}/tapdrinks/"
+                f"{tapdrink.drink_name}/{tapdrink.drink_size}/")
+
+    def existing_cocktail(i):
+        cocktail = Cocktail.query.filter_by(bar_name=pick(i)).first()
+        if cocktail is None:
+            return f"/api/bars/{pick(i)}/cocktails/"
+        return (f"/api/bars/{cocktail.bar_name}/cocktails/"
+                f"{cocktail.cocktail_name}/")
+
+    def new_bar(i):
+        return {"name": f"Benchmark-{i}", "address": f"Benchmark street {i}"}
+
+    def new_drink(i, price=5.0):
+        return {"bar_name": pick(i), "drink_type": "lager",
+                "drink_name": f"Benchmark {i}", "drink_size": 0.5,
+                "price": price}
+
+    def new_cocktail(i, price=10.0):
+        return {"bar_name": pick(i), "cocktail_name": f"Benchmark {i}",
+                "price": price}
+
+    def drink_path(i):
+        return f"/api/bars/{pick(i)}/tapdrinks/Benchmark {i}/0.5/"
+
+    def cocktail_path(i):
+        return f"/api/bars/{pick(i)}/cocktails/Benchmark {i}/"
+
+    return [
+        ("GET /api/bars/", lambda i: ("GET", "/api/bars/", None)),
+        ("GET /api/bars/?embed", lambda i: (
+            "GET", "/api/bars/?embed=tapdrinks,cocktails&limit=20", None)),
+        ("GET /api/bars/<bar>/", lambda i: (
+            "GET", f"/api/bars/{pick(i)}/", None)),
+        ("GET /api/bars/<bar>/?embed", lambda i: (
+            "GET", f"/api/bars/{pick(i)}/?embed=tapdrinks,cocktails", None)),
+        ("GET /api/bars/<bar>/tapdrinks/", lambda i: (
+            "GET", f"/api/bars/{pick(i)}/tapdrinks/", None)),
+        ("GET /api/bars/<bar>/tapdrinks/<drink>/", lambda i: (
+            "GET", existing_drink(i), None)),
+        ("GET /api/bars/<bar>/cocktails/", lambda i: (
+            "GET", f"/api/bars/{pick(i)}/cocktails/", None)),
+        ("GET /api/bars/<bar>/cocktails/<cocktail>/", lambda i: (
+            "GET", existing_cocktail(i), None)),
+        ("GET /api/bars/<bar>/stats/", lambda i: (
+            "GET", f"/api/bars/{pick(i)}/stats/", None)),
+        ("GET /api/drinks/", lambda i: ("GET", "/api/drinks/", None)),
+        ("GET /api/drinks/?sort=price_per_litre", lambda i: (
+            "GET", "/api/drinks/?sort=price_per_litre", None)),
+        ("GET /api/stats/", lambda i: ("GET", "/api/stats/", None)),
+        ("GET /api/search/", lambda i: (
+            "GET", f"/api/search/?q={DRINK_NAMES[i % len(DRINK_NAMES)]}",
+            None)),
+        ("GET /api/changes/", lambda i: ("GET", "/api/changes/", None)),
+        ("GET /api/cache/", lambda i: ("GET", "/api/cache/", None)),
+        ("POST /api/bars/", lambda i: ("POST", "/api/bars/", new_bar(i))),
+        ("PUT /api/bars/<bar>/", lambda i: (
+            "PUT", f"/api/bars/Benchmark-{i}/",
+            dict(new_bar(i), address="Moved"))),
+        ("DELETE /api/bars/<bar>/", lambda i: (
+            "DELETE", f"/api/bars/Benchmark-{i}/", None)),
+        ("POST /api/bars/<bar>/tapdrinks/", lambda i: (
+            "POST", f"/api/bars/{pick(i)}/tapdrinks/", new_drink(i))),
+        ("PUT /api/bars/<bar>/tapdrinks/<drink>/", lambda i: (
+            "PUT", drink_path(i), new_drink(i, price=6.0))),
+        ("DELETE /api/bars/<bar>/tapdrinks/<drink>/", lambda i: (
+            "DELETE", drink_path(i), None)),
+        ("POST /api/bars/<bar>/cocktails/", lambda i: (
+            "POST", f"/api/bars/{pick(i)}/cocktails/", new_cocktail(i))),
+        ("PUT /api/bars/<bar>/cocktails/<cocktail>/", lambda i: (
+            "PUT", cocktail_path(i), new_cocktail(i, price=11.0))),
+        ("DELETE /api/bars/<bar>/cocktails/<cocktail>/", lambda i: (
+            "DELETE", cocktail_path(i), None)),
+        ("GET /metrics", lambda i: ("GET", "/metrics", None)),
+    ]
+
+
+def run(client, build, indices, traced=False):
+    """
+    Sends the requests of the given indices and returns their latencies in
+    seconds, the number of error responses and, when traced, the peak
+    memory allocated by each request in bytes.
+    """
+
+    latencies = []
+    peaks = []
+    errors = 0
+    for i in indices:
+        # building the request may query the database, it is not measured
+        with app.app_context():
+            method, path, doc = build(i)
+        if traced:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=doc)
+        response.get_data()
+        latencies.append(time.perf_counter() - started)
+        if traced:
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        response.close()
+        if response.status_code >= 400:
+            errors += 1
+    return latencies, errors, peaks
+
+
+def summarize(latencies, errors, peaks):
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "ops_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "alloc_peak_kib": round(statistics.mean(peaks) / 1024, 1)
+        if peaks else None,
+    }
+
+
+def benchmark(args, bars):
+    """
+    Generates a dataset of the given number of bars in a temporary database
+    and measures every endpoint on it.
+    """
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + db_path
+    try:
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            generate(bars, args.drinks, args.cocktails, args.seed)
+            print(f"\n{bars} bars generated in "
+                  f"{time.perf_counter() - started:.1f} s")
+        bar_cache.clear()
+        response_cache.clear()
+        client = app.test_client()
+        results = {}
+        print(f"{'endpoint':<48} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'KiB':>8} {'errors':>6}")
+        for name, build in scenarios(bars, args.seed):
+            if args.endpoint and not any(
+                    pattern in name for pattern in args.endpoint):
+                continue
+            latencies, errors, _ = run(client, build, range(args.requests))
+            tracemalloc.start()
+            try:
+                _, traced_errors, peaks = run(
+                    client, build,
+                    range(args.requests, args.requests + args.trace), True)
+            finally:
+                tracemalloc.stop()
+            result = results[name] = summarize(
+                latencies, errors + traced_errors, peaks)
+            print(f"{name:<48} {result['ops_per_sec']:>9} "
+                  f"{result['p50_ms']:>8} {result['p95_ms']:>8} "
+                  f"{result['p99_ms']:>8} {result['alloc_peak_kib'] or '-':>8} "
+                  f"{result['errors']:>6}")
+        return results
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+def compare(report, baseline):
+    """
+    Prints the change of throughput and p95 latency of every endpoint
+    measured both in the report and in the baseline.
+    """
+
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'}")
+    print(f"{'bars':>7} {'endpoint':<48} {'ops/s':>8} {'p95':>8}")
+    for bars, results in report["datasets"].items():
+        for name, result in results.items():
+            before = baseline.get("datasets", {}).get(bars, {}).get(name)
+            if before is None:
+                continue
+            ops = result["ops_per_sec"] / before["ops_per_sec"] - 1
+            p95 = result["p95_ms"] / before["p95_ms"] - 1
+            print(f"{bars:>7} {name:<48} {ops:>+8.1%} {p95:>+8.1%}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(current),
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bars", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="dataset sizes in bars")
+    parser.add_argument("--drinks", type=int, default=10,
+                        help="tapdrinks per bar")
+    parser.add_argument("--cocktails", type=int, default=5,
+                        help="cocktails per bar")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="timed requests per endpoint")
+    parser.add_argument("--trace", type=int, default=20,
+                        help="requests per endpoint traced for allocations")
+    parser.add_argument("--seed", type=int, default=2023)
+    parser.add_argument("--endpoint", nargs="+",
+                        help="only endpoints whose name contains one of these")
+    parser.add_argument("--no-response-cache", action="store_true",
+                        help="measure reads without the response cache")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare",
+                        help="compare the results to this earlier JSON file")
+    args = parser.parse_args()
+    if args.requests < 2:
+        parser.error("--requests must be at least 2 to compute percentiles")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    if args.no_response_cache:
+        response_cache.maxsize = 0
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "compare")},
+        "datasets": {},
+    }
+    for bars in args.bars:
+        report["datasets"][str(bars)] = benchmark(args, bars)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    if baseline is not None:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the JSON encoders available for Mason responses on large collection
+documents. The documents are built with InventoryBuilder exactly like
+TapdrinkCollection.get builds them, so the controls are included in the
+measurement. Like in the API, the controls only link their schema with a
+schemaUrl instead of embedding it.
+
+Usage:
+
+    python benchmarks/json_encoders.py [--items 1000 5000] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+# add parent directory to path to import app (when running from the project root)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+from app import ENCODERS, LINK_RELATIONS_URL, Bar, InventoryBuilder, Tapdrink, app, orjson, tapdrink_item  # nopep8
+
+
+def build_collection(items):
+    """
+    Builds a tapdrink collection document with the given number of items.
+    """
+
+    bar = Bar(name="Benchmark bar", address="Benchmark street 1")
+    body = InventoryBuilder(items=[])
+    body.add_namespace("almeta", LINK_RELATIONS_URL)
+    body.add_control("self", href="/api/bars/Benchmark%20bar/tapdrinks/")
+    body.add_control_add_tapdrink(bar)
+    for i in range(items):
+        tapdrink = Tapdrink(
+            bar_name=bar.name,
+            drink_type="Beer",
+            drink_name=f"Benchmark lager {i}",
+            drink_size=0.5,
+            price=5.0 + i / 100)
+        body["items"].append(tapdrink_item(bar, tapdrink))
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    encoders = {name: encode for name, encode in ENCODERS.items()
+                if name != "orjson" or orjson is not None}
+    if orjson is None:
+        print("orjson is not installed, only the standard library is measured")
+
+    with app.test_request_context("/api/bars/Benchmark%20bar/tapdrinks/"):
+        print(f"{'items':>8} {'encoder':>8} {'bytes':>10} {'ms/doc':>10} {'speedup':>8}")
+        for items in args.items:
+            body = build_collection(items)
+            baseline = None
+            for name, encode in encoders.items():
+                size = len(encode(body))
+                seconds = min(timeit.repeat(
+                    lambda: encode(body), number=1, repeat=args.repeat))
+                baseline = baseline or seconds
+                print(f"{items:>8} {name:>8} {size:>10} "
+                      f"{seconds * 1000:>10.3f} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
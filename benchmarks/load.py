@@ -0,0 +1,425 @@
+"""
+Load tests the API served by several worker processes sharing one SQLite
+database, the way a deployment would run it.
+
+A dataset is generated like in benchmarks/api.py, then the app is served by
+N single-threaded worker processes accepting connections from one shared
+listening socket, so the kernel spreads the connections over them like a
+pre-forking server does. C client processes send a weighted mix of reads
+and of POST, PUT and DELETE requests on bars, tapdrinks and cocktails over
+HTTP for the given duration. The report gives the throughput, the latency
+percentiles of every operation, the status codes, and what sharing the
+SQLite file costs:
+
+- "database is locked" errors raised in the workers
+- busy waits, SQLite calls taking longer than --busy-threshold ms, which on
+  a small dataset is time spent waiting for the lock of another process
+- stale reads, a bar read right after its own PUT still showing the old
+  address, which happens when a worker serves a cached copy
+
+Workers and clients are forked, so the harness runs on Linux and macOS.
+
+Usage:
+
+    python benchmarks/load.py [--workers 4] [--clients 8] [--duration 10]
+        [--mix GET=80 PUT:bar=4 POST:tapdrink=3 ...] [--bars 100] [--drinks 10]
+        [--cocktails 5] [--journal-mode delete|wal] [--busy-threshold 10]
+        [--output results.json]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# add parent directory to path to import app (when running from the project root)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+from api import DRINK_NAMES, bar_name, generate, git_commit  # nopep8
+from app import app, db  # nopep8
+
+METHODS = ("GET", "POST", "PUT", "DELETE")
+RESOURCES = ("bar", "tapdrink", "cocktail")
+# the operations of the mix, reads are spread over several resources
+OPERATIONS = ("GET",) + tuple(
+    f"{method} {resource}" for method in METHODS[1:] for resource in RESOURCES)
+DEFAULT_MIX = ["GET=80", "POST:bar=1", "PUT:bar=4", "DELETE:bar=1",
+               "POST:tapdrink=3", "PUT:tapdrink=2", "DELETE:tapdrink=2",
+               "POST:cocktail=3", "PUT:cocktail=2", "DELETE:cocktail=2"]
+
+# counters shared by the worker processes, set up before they are forked
+locked_errors = None
+busy_waits = None
+busy_seconds = None
+
+
+@contextlib.contextmanager
+def timed_call(threshold):
+    """
+    Counts a SQLite call taking longer than the threshold as a busy wait and
+    a "database is locked" error as such.
+    """
+
+    started = time.perf_counter()
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e):
+            with locked_errors.get_lock():
+                locked_errors.value += 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold:
+            with busy_waits.get_lock():
+                busy_waits.value += 1
+                busy_seconds.value += elapsed
+
+
+def timed_connection(threshold):
+    """
+    Returns a sqlite3 connection factory timing every statement and commit.
+    """
+
+    class TimedCursor(sqlite3.Cursor):
+        def execute(self, *args):
+            with timed_call(threshold):
+                return super().execute(*args)
+
+        def executemany(self, *args):
+            with timed_call(threshold):
+                return super().executemany(*args)
+
+    class TimedConnection(sqlite3.Connection):
+        def cursor(self, factory=TimedCursor):
+            return super().cursor(factory)
+
+        def commit(self):
+            with timed_call(threshold):
+                return super().commit()
+
+    return TimedConnection
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(listener, database, threshold):
+    """
+    Runs a single-threaded worker on the shared listening socket.
+    """
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "connect_args": {"factory": timed_connection(threshold)}}
+    host, port = listener.getsockname()[:2]
+    make_server(host, port, app, request_handler=QuietHandler,
+                fd=listener.fileno()).serve_forever()
+
+
+def prepare(database, bars, drinks, cocktails, seed, journal_mode):
+    """
+    Generates the dataset, in its own process so that the workers are forked
+    without an engine or connection of the parent.
+    """
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + database
+    with app.app_context():
+        db.create_all()
+        generate(bars, drinks, cocktails, seed)
+        db.engine.dispose()
+    with sqlite3.connect(database) as connection:
+        connection.execute(f"PRAGMA journal_mode={journal_mode}")
+
+
+def client(number, address, bars, mix, duration, seed):
+    """
+    Sends requests of the mix until the duration is over and returns the
+    latencies of every operation, the counts of the status codes and the
+    number of stale reads.
+
+    Rows created by the client are the ones it updates and deletes. A PUT of
+    a bar moves one of the generated bars to an address no other client
+    uses and reads the bar back, which should never show the old address.
+    """
+
+    rng = random.Random(f"{seed}-client-{number}")
+    operations, weights = zip(*mix.items())
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    latencies = {operation: [] for operation in OPERATIONS}
+    statuses = {}
+    created = {resource: [] for resource in RESOURCES}
+    sequence = 0
+    stale_reads = 0
+
+    def send(method, path, doc=None):
+        body = json.dumps(doc) if doc is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            return str(response.status), response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            return "connection error", b""
+
+    def address_of(bar):
+        status, data = send("GET", f"/api/bars/{bar}/")
+        return json.loads(data)["address"] if status == "200" else None
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        method, _, resource = operation.partition(" ")
+        # generated bars are updated, everything else only once created
+        updates_own = method == "DELETE" or method == "PUT" and resource != "bar"
+        if updates_own and not created[resource]:
+            method, operation = "POST", f"POST {resource}"
+        sequence += 1
+        name = f"Load-{number}-{sequence}"
+        bar = bar_name(rng.randrange(bars))
+        doc = None
+        previous = None
+        if method == "GET":
+            path = rng.choice((
+                f"/api/bars/{bar}/",
+                f"/api/bars/{bar}/tapdrinks/",
+                f"/api/bars/{bar}/cocktails/",
+                "/api/drinks/",
+                f"/api/search/?q={rng.choice(DRINK_NAMES).split()[0]}",
+            ))
+        elif resource == "bar":
+            if method == "POST":
+                path = "/api/bars/"
+                doc = {"name": name, "address": "Load street 1"}
+            elif method == "PUT":
+                previous = address_of(bar)
+                path = f"/api/bars/{bar}/"
+                doc = {"name": bar, "address": f"{name} street"}
+            else:
+                name = created[resource].pop(rng.randrange(len(created[resource])))
+                path = f"/api/bars/{name}/"
+        else:
+            collection = f"{resource}s"
+            if method == "POST":
+                path = f"/api/bars/{bar}/{collection}/"
+            else:
+                bar, name = created[resource][rng.randrange(len(created[resource]))]
+                if method == "DELETE":
+                    created[resource].remove((bar, name))
+                path = f"/api/bars/{bar}/{collection}/{name}/"
+                if resource == "tapdrink":
+                    path += "0.5/"
+            if method != "DELETE":
+                doc = {"bar_name": bar, "price": round(rng.uniform(4, 12), 2)}
+                if resource == "tapdrink":
+                    doc.update(drink_type="lager", drink_name=name,
+                               drink_size=0.5)
+                else:
+                    doc["cocktail_name"] = name
+
+        started = time.perf_counter()
+        status, _ = send(method, path, doc)
+        latencies[operation].append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+        if method == "POST" and status == "201":
+            created[resource].append(name if resource == "bar" else (bar, name))
+        if previous is not None and status == "204" \
+                and address_of(bar) == previous:
+            stale_reads += 1
+    connection.close()
+    return latencies, statuses, stale_reads
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        return None
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def parse_mix(values):
+    """
+    Parses the weights of the operations, given as METHOD:resource=WEIGHT or,
+    to spread the weight evenly over the resources, METHOD=WEIGHT.
+    """
+
+    mix = {}
+    for value in values:
+        target, _, weight = value.partition("=")
+        method, _, resource = target.partition(":")
+        method = method.upper()
+        if resource:
+            operations = [f"{method} {resource.lower()}"]
+        elif method == "GET":
+            operations = ["GET"]
+        else:
+            operations = [f"{method} {resource}" for resource in RESOURCES]
+        try:
+            weight = float(weight)
+        except ValueError:
+            weight = -1
+        if weight < 0 or not set(operations) <= set(OPERATIONS):
+            raise ValueError(f"invalid mix entry {value}, use "
+                             "METHOD:resource=WEIGHT or METHOD=WEIGHT")
+        for operation in operations:
+            mix[operation] = mix.get(operation, 0) + weight / len(operations)
+    if not any(mix.values()):
+        raise ValueError("the mix needs at least one positive weight")
+    return mix
+
+
+def main():
+    global locked_errors, busy_waits, busy_seconds
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4,
+                        help="server worker processes")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="client processes sending requests")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds to send requests for")
+    parser.add_argument("--mix", nargs="+", default=DEFAULT_MIX,
+                        help="weights of the operations, as "
+                             "METHOD:resource=WEIGHT with resource one of "
+                             "bar, tapdrink and cocktail, or METHOD=WEIGHT "
+                             "for every resource")
+    parser.add_argument("--bars", type=int, default=100)
+    parser.add_argument("--drinks", type=int, default=10,
+                        help="tapdrinks per bar")
+    parser.add_argument("--cocktails", type=int, default=5,
+                        help="cocktails per bar")
+    parser.add_argument("--seed", type=int, default=2023)
+    parser.add_argument("--journal-mode", default="delete",
+                        choices=["delete", "truncate", "persist", "wal"])
+    parser.add_argument("--busy-threshold", type=float, default=10,
+                        help="ms after which a SQLite call counts as a busy wait")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0,
+                        help="port to serve on, any free port if 0")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    context = multiprocessing.get_context("fork")
+    locked_errors = context.Value("i", 0)
+    busy_waits = context.Value("i", 0)
+    busy_seconds = context.Value("d", 0.0)
+
+    db_fd, database = tempfile.mkstemp(suffix=".db")
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    workers = []
+    try:
+        started = time.perf_counter()
+        preparation = context.Process(target=prepare, args=(
+            database, args.bars, args.drinks, args.cocktails, args.seed,
+            args.journal_mode))
+        preparation.start()
+        preparation.join()
+        if preparation.exitcode != 0:
+            sys.exit("generating the dataset failed")
+        print(f"{args.bars} bars generated in "
+              f"{time.perf_counter() - started:.1f} s")
+
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((args.host, args.port))
+        listener.listen(128)
+        address = listener.getsockname()[:2]
+        for _ in range(args.workers):
+            worker = context.Process(target=serve, args=(
+                listener, database, args.busy_threshold / 1000), daemon=True)
+            worker.start()
+            workers.append(worker)
+        print(f"{args.workers} workers serving on {address[0]}:{address[1]}, "
+              f"{args.clients} clients for {args.duration:g} s")
+
+        with context.Pool(args.clients) as pool:
+            results = pool.starmap(client, [
+                (number, address, args.bars, mix, args.duration, args.seed)
+                for number in range(args.clients)])
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        listener.close()
+        os.close(db_fd)
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(database + suffix)
+
+    latencies = {operation: [] for operation in OPERATIONS}
+    statuses = {}
+    stale_reads = 0
+    for client_latencies, client_statuses, client_stale_reads in results:
+        for operation, values in client_latencies.items():
+            latencies[operation].extend(values)
+        for status, count in client_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+        stale_reads += client_stale_reads
+    total = sum(statuses.values())
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items()
+                   if key != "output"},
+        "requests": total,
+        "throughput": round(total / args.duration, 1),
+        "statuses": dict(sorted(statuses.items())),
+        "latency": {operation: percentiles(values)
+                    for operation, values in latencies.items() if values},
+        "database_locked": locked_errors.value,
+        "database_locked_rate": round(locked_errors.value / max(total, 1), 5),
+        "busy_waits": busy_waits.value,
+        "busy_wait_seconds": round(busy_seconds.value, 3),
+        "stale_reads": stale_reads,
+    }
+
+    print(f"\n{total} requests, {report['throughput']} requests/s")
+    print(f"{'operation':<16} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for operation, result in report["latency"].items():
+        if result is not None:
+            print(f"{operation:<16} {result['requests']:>9} {result['p50_ms']:>8} "
+                  f"{result['p95_ms']:>8} {result['p99_ms']:>8} "
+                  f"{result['max_ms']:>8}")
+    print("statuses: " + ", ".join(
+        f"{status}: {count}" for status, count in report["statuses"].items()))
+    print(f"database is locked: {report['database_locked']} "
+          f"({report['database_locked_rate']:.3%} of requests)")
+    print(f"busy waits over {args.busy_threshold:g} ms: "
+          f"{report['busy_waits']}, {report['busy_wait_seconds']} s in total")
+    print(f"stale reads of a bar after its update: {report['stale_reads']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+
+
+if __name__ == "__main__":
+    main()
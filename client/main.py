@@ -383,16 +383,24 @@ class BarsListView(tk.CTkFrame, App):
         """
         Uses requests to get all available bars from the API.
         """
-        try:
-            response = requests.get(f"{API_URL}bars/", timeout=5)
-        except ConnectionError:
-            self.app.show_message_box(
-                "Error", "Could not connect to the server")
-        else:
-            if response.status_code == 200:
-                self.bars = response.json()['items']
-            else:
+        self.bars = []
+        # the bars come a page at a time, the next one is linked in the
+        # controls until the last page
+        location = f"{API_URL}bars/"
+        while location:
+            try:
+                response = requests.get(location, timeout=5)
+            except ConnectionError:
+                self.app.show_message_box(
+                    "Error", "Could not connect to the server")
+                return
+            if response.status_code != 200:
                 self.app.show_error(response)
+                return
+            body = response.json()
+            self.bars.extend(body['items'])
+            next_page = body.get('@controls', {}).get('next')
+            location = f"{BASE_URL}{next_page['href']}" if next_page else None
 
     def create_buttons(self):
         """
@@ -492,20 +500,15 @@ class BarView(tk.CTkFrame, App):
         """
         Uses requests to get all available tapdrinks and cocktails from the API.
         """
-        tapdrinks = requests.get(
-            f"{API_URL}bars/{self.bar['name']}/tapdrinks/", timeout=5)
-        cocktails = requests.get(
-            f"{API_URL}bars/{self.bar['name']}/cocktails/", timeout=5)
-        if tapdrinks.status_code == 200:
-            jsondata = json.loads(tapdrinks.text)
-            self.tapdrinks = jsondata['items']
-        else:
-            self.app.show_error(tapdrinks)
-        if cocktails.status_code == 200:
-            jsondata = json.loads(cocktails.text)
-            self.cocktails = jsondata['items']
+        response = requests.get(
+            f"{API_URL}bars/{self.bar['name']}/",
+            params={"embed": "tapdrinks,cocktails"}, timeout=5)
+        if response.status_code == 200:
+            jsondata = json.loads(response.text)
+            self.tapdrinks = jsondata['tapdrinks']
+            self.cocktails = jsondata['cocktails']
         else:
-            self.app.show_error(cocktails)
+            self.app.show_error(response)
         self.show_bar_info()
 
     def show_bar_info(self):
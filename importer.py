@@ -0,0 +1,202 @@
+"""
+Bulk import of bars and menus from CSV or NDJSON files.
+
+Rows are streamed from the file, validated against the json_schema() of the
+target model and written with one executemany INSERT per batch, each batch
+in its own transaction. After every committed batch the number of consumed
+rows is stored in a checkpoint file, so an interrupted import continues
+where it stopped instead of starting over.
+"""
+
+import csv
+import json
+import os
+import time
+
+from jsonschema.validators import validator_for
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def detect_format(path):
+    """
+    Guesses the file format from the extension of the path.
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise ImportFailed(f"Cannot detect the format of {path}")
+
+
+def coerce(row, schema):
+    """
+    Converts the string values of a CSV row to the types declared in the
+    schema. Empty cells are left out so that optional fields stay optional.
+    Values that cannot be converted are kept as they are and reported by the
+    schema validation.
+    """
+
+    doc = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        kind = schema["properties"].get(key, {}).get("type")
+        try:
+            if kind == "number":
+                value = float(value)
+            elif kind == "integer":
+                value = int(value)
+        except ValueError:
+            pass
+        doc[key] = value
+    return doc
+
+
+def read_rows(path, fmt, schema):
+    """
+    Streams the documents of a CSV or NDJSON file.
+
+    : yield: tuple of (line number, document)
+    """
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, coerce(row, schema)
+        else:
+            for number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+
+
+def row_values(model, doc):
+    """
+    Returns the column values of a validated document as a dict suitable for
+    an executemany INSERT. The model's deserialize method does the mapping,
+    so imported rows look exactly like rows created through the API.
+    """
+
+    item = model()
+    item.deserialize(doc)
+    values = {}
+    for attr in inspect(model).column_attrs:
+        column = attr.columns[0]
+        value = getattr(item, attr.key)
+        # leave unset columns with a default to the INSERT, which fills them,
+        # and generated columns to SQLite
+        if (attr.key == "id" or column.computed is not None
+                or value is None and column.default is not None):
+            continue
+        values[attr.key] = value
+    return values
+
+
+def read_checkpoint(path):
+    """
+    Returns the number of rows an earlier run already committed.
+    """
+
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)["rows"]
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, rows):
+    """
+    Atomically stores the number of committed rows.
+    """
+
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump({"rows": rows}, handle)
+    os.replace(temporary, path)
+
+
+def import_file(session, model, path, fmt=None, batch_size=1000,
+                checkpoint=None, on_conflict="fail", echo=None):
+    """
+    Imports a CSV or NDJSON file into the table of a model.
+
+    Invalid rows are skipped and reported. With on_conflict="ignore" rows
+    that would violate a unique constraint are skipped by SQLite, with
+    "fail" the import stops at the first conflicting batch and can be
+    resumed from the checkpoint once the input is fixed.
+
+    : param session: SQLAlchemy session
+    : param model: Bar, Tapdrink or Cocktail
+    : param str path: file to import
+    : param str fmt: "csv" or "ndjson", detected from the extension if None
+    : param int batch_size: rows per transaction
+    : param str checkpoint: checkpoint file, no checkpoints if None
+    : param str on_conflict: "fail" or "ignore"
+    : param echo: optional callable receiving progress lines
+    : return: dict with the counts of imported, skipped and rejected rows
+        and a list of (line number, message) errors
+    : raises ImportFailed: if a batch cannot be written
+    """
+
+    fmt = fmt or detect_format(path)
+    schema = model.json_schema()
+    validator = validator_for(schema)(schema)
+    statement = model.__table__.insert()
+    if on_conflict == "ignore":
+        statement = statement.prefix_with("OR IGNORE")
+    done = read_checkpoint(checkpoint) if checkpoint else 0
+    stats = {"imported": 0, "skipped": done, "rejected": 0, "errors": []}
+    started = time.perf_counter()
+    batch = []
+    consumed = 0
+
+    def flush():
+        try:
+            result = session.execute(statement, batch)
+            session.commit()
+        except IntegrityError as e:
+            session.rollback()
+            raise ImportFailed(
+                f"Batch ending at line {line} violates a constraint: {e.orig}"
+            ) from e
+        # rows skipped by OR IGNORE are not counted by rowcount
+        stats["imported"] += result.rowcount if result.rowcount >= 0 else len(batch)
+        batch.clear()
+        if checkpoint:
+            write_checkpoint(checkpoint, consumed)
+        if echo is not None:
+            rate = stats["imported"] / max(time.perf_counter() - started, 1e-9)
+            echo(f"{consumed} rows processed, "
+                 f"{stats['imported']} imported ({rate:.0f} rows/s)")
+
+    line = 0
+    for line, doc in read_rows(path, fmt, schema):
+        consumed += 1
+        if consumed <= done:
+            continue
+        if isinstance(doc, Exception):
+            message = f"Invalid JSON: {doc}"
+        else:
+            error = next(validator.iter_errors(doc), None)
+            message = error.message if error is not None else None
+        if message is not None:
+            stats["rejected"] += 1
+            stats["errors"].append((line, message))
+        else:
+            batch.append(row_values(model, doc))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
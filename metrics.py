@@ -0,0 +1,199 @@
+"""
+Counters and histograms of the API in the Prometheus text format.
+
+Every thread records its samples in a shard of its own, so recording takes
+no lock and threads never contend on the same counters. The shards are only
+merged when the metrics are collected. Shards of finished threads are
+folded into a shared one, so a server starting a thread per request keeps
+a bounded number of them.
+"""
+
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Registry:
+    """
+    The metrics of the application and the per-thread shards holding their
+    samples. A shard maps (metric name, label values) to a number for
+    counters and to [bucket counts, sum] for histograms.
+    """
+
+    # finished threads are folded in once this many shards exist
+    RETIRE_AFTER = 64
+
+    def __init__(self):
+        self.metrics = []
+        self._shards = []
+        self._retired = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(self, name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, buckets, labels=()):
+        metric = Histogram(self, name, documentation, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def shard(self):
+        """
+        Returns the shard of the current thread.
+        """
+
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= self.RETIRE_AFTER:
+                    self._retire()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire(self):
+        """
+        Folds the shards of finished threads into the retired shard. Must be
+        called with the lock held.
+        """
+
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                merge(self._retired, shard)
+        self._shards = alive
+
+    def samples(self):
+        """
+        Returns the merged samples of every thread.
+        """
+
+        with self._lock:
+            self._retire()
+            merged = {}
+            merge(merged, self._retired)
+            for _, shard in self._shards:
+                merge(merged, shard)
+        return merged
+
+    def clear(self):
+        with self._lock:
+            self._retired.clear()
+            for _, shard in self._shards:
+                shard.clear()
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+
+        samples = self.samples()
+        by_metric = {}
+        for (name, values), sample in sorted(samples.items(), key=repr):
+            by_metric.setdefault(name, []).append((values, sample))
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for values, sample in by_metric.get(metric.name, ()):
+                lines.extend(metric.render(values, sample))
+        return "\n".join(lines) + "\n"
+
+
+def merge(target, shard):
+    """
+    Adds the samples of a shard to another one.
+    """
+
+    # list() copies the items at once, while the owning thread may be adding
+    for key, sample in list(shard.items()):
+        if isinstance(sample, list):
+            counts, total = sample
+            current = target.get(key)
+            if current is None:
+                target[key] = [list(counts), total]
+            else:
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += total
+        else:
+            target[key] = target.get(key, 0) + sample
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    ) + "}"
+
+
+def format_number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, documentation, labels):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def inc(self, *values, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, values)
+        shard[key] = shard.get(key, 0) + amount
+
+    def render(self, values, sample):
+        yield (f"{self.name}{format_labels(self.labels, values)} "
+               f"{format_number(sample)}")
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labels, buckets):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *values):
+        shard = self.registry.shard()
+        key = (self.name, values)
+        sample = shard.get(key)
+        if sample is None:
+            sample = shard[key] = [[0] * (len(self.buckets) + 1), 0]
+        sample[0][bisect.bisect_left(self.buckets, value)] += 1
+        sample[1] += value
+
+    def render(self, values, sample):
+        counts, total = sample
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else format_number(float(bound))
+            labels = format_labels(self.labels, values, [("le", le)])
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = format_labels(self.labels, values)
+        yield f"{self.name}_sum{labels} {format_number(total)}"
+        yield f"{self.name}_count{labels} {cumulative}"
@@ -0,0 +1,406 @@
+"""
+Versioned schema migrations for the Oulu Bars database.
+
+The schema version of a database file is stored in SQLite's user_version
+pragma. Every migration is a (version, description, steps) tuple where each
+step is either an SQL string or a callable taking an SQLAlchemy connection.
+Steps are written so that running them against a database created with
+db.create_all() is harmless, which lets fresh and old databases converge on
+the same schema.
+"""
+
+
+def _bump(key):
+    return (
+        "INSERT INTO version_counter (key, version) VALUES (" + key + ", 1) "
+        "ON CONFLICT (key) DO UPDATE SET version = version + 1;"
+    )
+
+
+def _trigger(table, operation, keys):
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version "
+        f"AFTER {operation} ON {table} BEGIN "
+        + " ".join(_bump(key) for key in keys)
+        + " END"
+    )
+
+
+# Every write bumps the counters of the data it touches: "bars" for the bar
+# table, "bar:<name>" for a bar and its menu and "catalogue" for everything.
+# Triggers see bulk inserts, imports and cascades that the ORM never does.
+VERSION_TRIGGERS = [
+    _trigger("bar", "INSERT",
+             ["'bars'", "'bar:' || NEW.name", "'catalogue'"]),
+    _trigger("bar", "UPDATE",
+             ["'bars'", "'bar:' || OLD.name", "'bar:' || NEW.name",
+              "'catalogue'"]),
+    _trigger("bar", "DELETE",
+             ["'bars'", "'bar:' || OLD.name", "'catalogue'"]),
+] + [
+    trigger
+    for table in ("tapdrink", "cocktail")
+    for trigger in (
+        _trigger(table, "INSERT", ["'bar:' || NEW.bar_name", "'catalogue'"]),
+        _trigger(table, "UPDATE",
+                 ["'bar:' || OLD.bar_name", "'bar:' || NEW.bar_name",
+                  "'catalogue'"]),
+        _trigger(table, "DELETE", ["'bar:' || OLD.bar_name", "'catalogue'"]),
+    )
+]
+
+# Natural keys of the rows, recorded in the tombstones of deleted rows.
+TOMBSTONE_KEYS = {
+    "bar": ("name",),
+    "tapdrink": ("bar_name", "drink_name", "drink_size"),
+    "cocktail": ("bar_name", "cocktail_name"),
+}
+
+
+def _log_upsert(table):
+    # only the newest entry of a live row is kept, so the log grows with the
+    # number of rows and deletes rather than with every write
+    return (
+        f"DELETE FROM change_log WHERE kind = '{table}' AND row_id = NEW.id "
+        "AND tombstone IS NULL; "
+        f"INSERT INTO change_log (kind, row_id) VALUES ('{table}', NEW.id);"
+    )
+
+
+def _log_tombstone(table):
+    fields = ", ".join(f"'{key}', OLD.{key}" for key in TOMBSTONE_KEYS[table])
+    return (
+        "INSERT INTO change_log (kind, row_id, tombstone) "
+        f"VALUES ('{table}', OLD.id, json_object({fields}));"
+    )
+
+
+# Every write appends to change_log. Deletes, and updates that change the
+# natural key of a row, leave a tombstone with the old key behind.
+CHANGE_TRIGGERS = [
+    trigger
+    for table, keys in TOMBSTONE_KEYS.items()
+    for trigger in (
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_change "
+        f"AFTER INSERT ON {table} BEGIN {_log_upsert(table)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_update_change "
+        f"AFTER UPDATE ON {table} BEGIN {_log_upsert(table)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rekey_change "
+        f"AFTER UPDATE ON {table} WHEN "
+        + " OR ".join(f"OLD.{key} IS NOT NEW.{key}" for key in keys)
+        + f" BEGIN {_log_tombstone(table)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_change "
+        f"AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM change_log WHERE kind = '{table}' AND row_id = OLD.id "
+        f"AND tombstone IS NULL; {_log_tombstone(table)} END",
+    )
+]
+
+# The search index holds one row per bar, tapdrink and cocktail. Its rowid
+# encodes the kind and the id of the row, so the triggers can update entries
+# by rowid instead of scanning the index.
+SEARCH_KINDS = ("bar", "tapdrink", "cocktail")
+
+# name, details and bar columns of the search index for every kind
+SEARCH_COLUMNS = {
+    "bar": ("name", "address", "NULL"),
+    "tapdrink": ("drink_name", "drink_type", "bar_name"),
+    "cocktail": ("cocktail_name", "NULL", "bar_name"),
+}
+
+# Matches in names weigh more than in types or addresses, which weigh more
+# than matches in the name of the bar serving a drink.
+SEARCH_TABLES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "name, details, bar, tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '2 3')",
+    "INSERT INTO search_index (search_index, rank) "
+    "VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')",
+]
+
+
+def _search_rowid(table, row):
+    return f"{row}.id * {len(SEARCH_KINDS)} + {SEARCH_KINDS.index(table)}"
+
+
+def _search_insert(table, row):
+    values = ", ".join(
+        column if column == "NULL" else f"{row}.{column}"
+        for column in SEARCH_COLUMNS[table])
+    return (
+        "INSERT INTO search_index (rowid, name, details, bar) "
+        f"VALUES ({_search_rowid(table, row)}, {values});"
+    )
+
+
+def _search_delete(table):
+    return (
+        "DELETE FROM search_index "
+        f"WHERE rowid = {_search_rowid(table, 'OLD')};"
+    )
+
+
+SEARCH_TRIGGERS = [
+    trigger
+    for table in SEARCH_KINDS
+    for trigger in (
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_search "
+        f"AFTER INSERT ON {table} BEGIN {_search_insert(table, 'NEW')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_update_search "
+        f"AFTER UPDATE ON {table} BEGIN {_search_delete(table)} "
+        f"{_search_insert(table, 'NEW')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_search "
+        f"AFTER DELETE ON {table} BEGIN {_search_delete(table)} END",
+    )
+]
+
+TRIGGERS = VERSION_TRIGGERS + CHANGE_TRIGGERS + SEARCH_TRIGGERS
+
+
+def _backfill_search_index(table):
+    columns = ", ".join(SEARCH_COLUMNS[table])
+    return (
+        "INSERT INTO search_index (rowid, name, details, bar) "
+        f"SELECT id * {len(SEARCH_KINDS)} + {SEARCH_KINDS.index(table)}, "
+        f"{columns} FROM {table}"
+    )
+
+
+def add_column(table, column, ddl):
+    """
+    Returns a migration step adding a column unless the table already has it,
+    SQLite has no ADD COLUMN IF NOT EXISTS.
+    """
+
+    def step(connection):
+        # table_info leaves generated columns out, table_xinfo does not
+        columns = [row[1] for row in connection.exec_driver_sql(
+            f"PRAGMA table_xinfo({table})")]
+        if column not in columns:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return step
+
+
+def _backfill_change_log(table):
+    return (
+        f"INSERT INTO change_log (kind, row_id) SELECT '{table}', id "
+        f"FROM {table} WHERE NOT EXISTS (SELECT 1 FROM change_log "
+        f"WHERE kind = '{table}' AND row_id = {table}.id) ORDER BY id"
+    )
+
+
+MIGRATIONS = [
+    (
+        1,
+        "Composite lookup indexes for tapdrinks and cocktails",
+        [
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_tapdrink_lookup "
+            "ON tapdrink (bar_name, drink_name, drink_size)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_cocktail_lookup "
+            "ON cocktail (bar_name, cocktail_name)",
+        ],
+    ),
+    (
+        2,
+        "Keyset pagination indexes for tapdrinks and cocktails",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_page "
+            "ON tapdrink (bar_name, id)",
+            "CREATE INDEX IF NOT EXISTS ix_cocktail_page "
+            "ON cocktail (bar_name, id)",
+        ],
+    ),
+    (
+        3,
+        "Version counters maintained by triggers for ETags",
+        [
+            "CREATE TABLE IF NOT EXISTS version_counter ("
+            "key VARCHAR(160) NOT NULL, version INTEGER NOT NULL, "
+            "PRIMARY KEY (key))",
+        ] + VERSION_TRIGGERS,
+    ),
+    (
+        4,
+        "updated_at columns and a change log with tombstones for syncing",
+        [
+            add_column(table, "updated_at", "DATETIME")
+            for table in TOMBSTONE_KEYS
+        ] + [
+            f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP "
+            "WHERE updated_at IS NULL"
+            for table in TOMBSTONE_KEYS
+        ] + [
+            "CREATE TABLE IF NOT EXISTS change_log ("
+            "seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+            "kind VARCHAR(16) NOT NULL, row_id INTEGER NOT NULL, "
+            "tombstone TEXT, "
+            "changed_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS ix_change_log_row "
+            "ON change_log (kind, row_id)",
+        ] + CHANGE_TRIGGERS + [
+            _backfill_change_log(table) for table in TOMBSTONE_KEYS
+        ],
+    ),
+    (
+        5,
+        "Price indexes for ranking drinks across bars",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_price "
+            "ON tapdrink (price, id)",
+            "CREATE INDEX IF NOT EXISTS ix_cocktail_price "
+            "ON cocktail (price, id)",
+        ],
+    ),
+    (
+        6,
+        "Generated price per litre column of tapdrinks for value rankings",
+        [
+            # SQLite can only add virtual generated columns to a table, the
+            # values of existing rows are computed on read
+            add_column("tapdrink", "price_per_litre",
+                       "FLOAT GENERATED ALWAYS AS (price / drink_size) VIRTUAL"),
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_value "
+            "ON tapdrink (price_per_litre, id)",
+        ],
+    ),
+    (
+        7,
+        "Full-text search index over bars, tapdrinks and cocktails",
+        SEARCH_TABLES + SEARCH_TRIGGERS + ["DELETE FROM search_index"] + [
+            _backfill_search_index(table) for table in SEARCH_KINDS
+        ],
+    ),
+    (
+        8,
+        "Price indexes for sorting and filtering the menu of a bar",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_bar_price "
+            "ON tapdrink (bar_name, price, id)",
+            "CREATE INDEX IF NOT EXISTS ix_cocktail_bar_price "
+            "ON cocktail (bar_name, price, id)",
+        ],
+    ),
+    (
+        9,
+        "Drink type index for the statistics of a bar",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_type "
+            "ON tapdrink (bar_name, drink_type)",
+        ],
+    ),
+    (
+        10,
+        "Price per litre index for sorting and filtering the tapdrinks of a bar",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_tapdrink_bar_value "
+            "ON tapdrink (bar_name, price_per_litre, id)",
+        ],
+    ),
+]
+
+
+def latest_version():
+    """
+    Returns the schema version the newest migration upgrades to.
+    """
+
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(connection):
+    """
+    Reads the schema version of the database behind the connection.
+
+    : param connection: SQLAlchemy connection
+    """
+
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def upgrade(engine, target=None, echo=None):
+    """
+    Upgrades the database in place, applying every migration newer than the
+    stored schema version up to and including target. Each migration runs in
+    its own transaction so an interrupted upgrade can simply be re-run.
+
+    : param engine: SQLAlchemy engine of the database to upgrade
+    : param int target: version to stop at, defaults to the newest one
+    : param echo: optional callable receiving a progress line per migration
+    : return: list of the applied migration versions
+    """
+
+    if target is None:
+        target = latest_version()
+    applied = []
+    with engine.connect() as connection:
+        version = current_version(connection)
+    for number, description, steps in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        with engine.begin() as connection:
+            for step in steps:
+                if callable(step):
+                    step(connection)
+                else:
+                    connection.exec_driver_sql(step)
+            # PRAGMA does not accept bound parameters
+            connection.exec_driver_sql(f"PRAGMA user_version = {int(number)}")
+        applied.append(number)
+        if echo is not None:
+            echo(f"Applied migration {number}: {description}")
+    return applied
+
+
+def explain_query_plan(connection, statement):
+    """
+    Runs EXPLAIN QUERY PLAN for an SQLAlchemy statement and returns the detail
+    column of every plan row.
+
+    : param connection: SQLAlchemy connection
+    : param statement: SQLAlchemy selectable, e.g. Query.statement
+    """
+
+    compiled = statement.compile(
+        dialect=connection.dialect,
+        compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + str(compiled), positional)
+    return [row[-1] for row in rows]
+
+
+def unindexed_steps(plan):
+    """
+    Returns the plan rows that indicate a full table scan or a temporary
+    sort. An empty list means the query is fully served by indexes. Scans
+    reading an index in order are accepted, they stop at the LIMIT of the
+    query, and so are lookups in the index of a virtual table like FTS5.
+
+    : param list plan: plan details from explain_query_plan
+    """
+
+    return [
+        detail for detail in plan
+        if detail.startswith("SCAN") and "USING" not in detail
+        and "VIRTUAL TABLE INDEX" not in detail
+        or "TEMP B-TREE" in detail
+    ]
+
+
+def check_query_plans(connection, queries):
+    """
+    Checks a mapping of name -> SQLAlchemy statement and returns a mapping of
+    name -> offending plan rows for every query that does not use an index.
+
+    : param connection: SQLAlchemy connection
+    : param dict queries: statements to check
+    """
+
+    failures = {}
+    for name, statement in queries.items():
+        bad = unindexed_steps(explain_query_plan(connection, statement))
+        if bad:
+            failures[name] = bad
+    return failures
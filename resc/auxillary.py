@@ -3,7 +3,6 @@ An Auxillary API for the Oulu Bars API, purpose of this work is to prove the wor
 """
 
 import json
-from operator import itemgetter
 import requests
 
 PORT = 5000
@@ -16,48 +15,38 @@ list_of_drinks = []
 
 
 def get_bars():
-    bars = requests.get(f"{API_URL}bars/", timeout=TIMEOUT)
-    if bars.status_code != 200:
-        print("Unfortunately it seems to be that there is no bars to go :(")
-    else:
-        jsondata = json.loads(bars.text)
-        get_bar_information(jsondata)
+    """Fetches every drink in town, cheapest first, as ranked by the API"""
+    list_of_drinks.clear()
+    # the lean representation leaves out the controls we never read, the
+    # next page is linked in the Link header instead
+    location = f"{API_URL}drinks/?sort=price&limit=1000&controls=none"
+    while location:
+        drinks = requests.get(location, timeout=TIMEOUT)
+        if drinks.status_code != 200:
+            print("Unfortunately it seems to be that there is no bars to go :(")
+            break
+        update_to_list_of_drinks(json.loads(drinks.text))
+        next_page = drinks.links.get("next")
+        location = f"{BASE_URL}{next_page['url']}" if next_page else None
     return list_of_drinks
 
 
-def get_bar_information(jsondata):
-    if len(jsondata["items"]) != 0:
-        print("You are in luck! There seems to be bars available! Fetching drinks")
-    for bar in jsondata["items"]:
-        # print(bar)
-        fetch_bar_catalogue(bar["@controls"]["self"]["href"])
-    sort_by_price()
-
-
-def fetch_bar_catalogue(location):
-    print("fetching from: {}", location)
-    catalogue_json = requests.get(f"{BASE_URL}{location}cocktails/", timeout=TIMEOUT)
-    if catalogue_json.status_code == 200:
-        bar_catalog = json.loads(catalogue_json.text)
-        update_to_list_of_drinks(bar_catalog["items"])
-    else:
-        show_error(catalogue_json)
-    catalogue_json = requests.get(f"{BASE_URL}{location}tapdrinks/", timeout=TIMEOUT)
-    if catalogue_json.status_code == 200:
-        bar_catalog = json.loads(catalogue_json.text)
-        update_to_list_of_drinks(bar_catalog["items"])
-    else:
-        show_error(catalogue_json)
+def get_drink(ranking):
+    """Fetches only the drink at the given position of the price ranking"""
+    drinks = requests.get(
+        f"{API_URL}drinks/?sort=price&limit=1&offset={ranking - 1}&controls=none",
+        timeout=TIMEOUT)
+    if drinks.status_code != 200:
+        show_error(drinks)
+        return None
+    items = json.loads(drinks.text)
+    return items[0] if items else None
 
 
 def update_to_list_of_drinks(bar_catalogue):
     list_of_drinks.extend(bar_catalogue)
 
 
-def sort_by_price():
-    list_of_drinks.sort(key=itemgetter("price", "bar_name"))
-
-
 def show_bar_info(jsondata):
     cocktails = jsondata["items"]
     print("this is info", cocktails)
@@ -24,13 +24,13 @@ app = Flask(__name__)
 @app.route("/topdrinks/<int:ranking>/")
 def get_ranking(ranking=1):
     """Purpose of this function is to respond to GET request at /topdrinks/<rankin>"""
-    value_list = auxillary.get_bars()
+    drink = auxillary.get_drink(int(ranking)) if int(ranking) > 0 else None
 
-    if int(ranking) < len(value_list):
-        return jsonify(value_list[int(ranking) - 1])
+    if drink is not None:
+        return jsonify(drink)
     else:
         return Response(
-            f"There is not enough drinks ({len(value_list)}) in to fullfill your thirst",
+            "There is not enough drinks in to fullfill your thirst",
             416,
         )
 
@@ -520,5 +520,145 @@ def test_cocktailitem_delete_nonexisting_cocktail(db_handle, client_handle):
     assert response.status_code == 404
 
 
+def test_barcollection_get_invalid_page(client_handle, db_handle):
+    '''
+    Tests whether invalid pagination parameters return a 400 error.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    response = client_handle.get('/api/bars/?limit=many')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/?limit=0')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/?after=first')
+    assert response.status_code == 400
+
+
+def test_baritem_get_invalid_embed(client_handle, db_handle):
+    '''
+    Tests whether embedding an unknown collection returns a 400 error.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/?embed=wines')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/?embed=tapdrinks,wines')
+    assert response.status_code == 400
+
+
+def test_tapdrinkcollection_post_bulk_invalid(client_handle, db_handle):
+    '''
+    Tests whether a bulk POST with an invalid element inserts nothing and reports every element.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    db_handle.session.commit()
+    valid = {'bar_name': 'Test-bar', 'drink_name': 'Test-tapdrink', 'drink_size': 0.5, 'price': 1.0}
+    response = client_handle.post(f'/api/bars/{bar.name}/tapdrinks/',
+                                  json=[valid, {'bar_name': 'Test-bar', 'price': -1}, valid])
+    assert response.status_code == 400
+    assert [item['status'] for item in response.json['items']] == [424, 400, 409]
+    assert Tapdrink.query.count() == 0
+
+
+def test_cocktailcollection_post_bulk_conflict(client_handle, db_handle):
+    '''
+    Tests whether a bulk POST containing an existing cocktail returns a 409 error.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    response = client_handle.post(f'/api/bars/{bar.name}/cocktails/',
+                                  json=[{'bar_name': 'Test-bar', 'cocktail_name': 'Test-cocktail', 'price': 1.0},
+                                        {'bar_name': 'Test-bar', 'cocktail_name': 'Test-new', 'price': 1.0}])
+    assert response.status_code == 409
+    assert [item['status'] for item in response.json['items']] == [409, 424]
+    assert Cocktail.query.count() == 1
+
+
+def test_drinkcollection_get_invalid(client_handle, db_handle):
+    '''
+    Tests whether an unknown sort key or an invalid offset returns a 400 error.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    assert client_handle.get('/api/drinks/?sort=name').status_code == 400
+    assert client_handle.get('/api/drinks/?offset=-1').status_code == 400
+    assert client_handle.get('/api/drinks/?offset=first').status_code == 400
+
+
+def test_searchresults_get_invalid(client_handle, db_handle):
+    '''
+    Tests whether a search without terms returns a 400 error and FTS5 syntax is searched literally.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    assert client_handle.get('/api/search/').status_code == 400
+    assert client_handle.get('/api/search/?q=%20').status_code == 400
+    response = client_handle.get('/api/search/?q=%22karhu%20OR%20NEAR(')
+    assert response.status_code == 200
+    assert response.json['items'] == []
+
+
+def test_tapdrinkcollection_get_invalid_filter(client_handle, db_handle):
+    '''
+    Tests whether an unknown sort key or a malformed filter value returns a 400 error.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?sort=drink_type')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?max_price=cheap')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/Test-bar/cocktails/?sort=price&after=999')
+    assert response.status_code == 400
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,6 +1,10 @@
+import gzip
+import json
 import os
 import sys
 import tempfile
+import threading
+from urllib.parse import quote
 
 import pytest
 from sqlalchemy import event
@@ -10,7 +14,9 @@ from sqlalchemy.engine import Engine
 current = os.path.dirname(os.path.realpath(__file__))  # nopep8
 sys.path.append(os.path.dirname(current))  # nopep8
 
-from app import Bar, Cocktail, Tapdrink, app, db  # nopep8
+import metrics  # nopep8
+from app import (ENCODERS, Bar, BarItem, Cocktail, CocktailItem, Tapdrink, TapdrinkItem, api, app,  # nopep8
+                 db, registry, routes, static_files, validators)
 
 
 @pytest.fixture
@@ -100,5 +106,289 @@ def test_link_relations(client_handle, db_handle):
     assert response.status_code == 200
 
 
+def test_validators_compiled_once(client_handle, db_handle, monkeypatch):
+    '''
+    Test that the write handlers and the Mason controls use the schemas compiled at startup.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+        monkeypatch: pytest monkeypatch fixture.
+
+    Returns:
+        None.
+    '''
+    def fail():
+        raise AssertionError("schema built during a request")
+
+    monkeypatch.setattr(Bar, "json_schema", staticmethod(fail))
+    response = client_handle.post(
+        '/api/bars/', json={'name': 'Test-bar', 'address': 'Test-address'})
+    assert response.status_code == 201
+    response = client_handle.post('/api/bars/', json={'name': 'Test-bar-2'})
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/')
+    schema_url = response.json['@controls']['almeta:add-bar']['schemaUrl']
+    assert client_handle.get(schema_url).json == validators.schema(Bar)
+
+
+@pytest.mark.parametrize("encoder", sorted(ENCODERS))
+def test_mason_encoders(client_handle, db_handle, encoder):
+    '''
+    Test that every JSON encoder produces the same Mason documents.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+        encoder: Name of the encoder to use.
+
+    Returns:
+        None.
+    '''
+    pytest.importorskip(encoder)
+    db_handle.session.add(Bar(name="Test-bar", address="Test-address"))
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    default = app.config["MASON_ENCODER"]
+    app.config["MASON_ENCODER"] = encoder
+    try:
+        response = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+        error = client_handle.get('/api/bars/Test-bar/tapdrinks/Test-tapdrink/0.33/')
+    finally:
+        app.config["MASON_ENCODER"] = default
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.mason+json'
+    assert response.json['items'][0]['drink_size'] == 0.5
+    assert response.json['@controls']['almeta:add-tapdrink']['schemaUrl'] == '/schemas/tapdrink/'
+    assert error.json['@error']['@message'] == 'Tapdrink not found'
+
+
+def test_gzip_responses(client_handle, db_handle):
+    '''
+    Test that large Mason documents are gzipped when the client accepts it, small ones are not.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(Bar(name="Test-bar", address="Test-address"))
+    for index in range(20):
+        db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                       drink_name=f"Test-tapdrink-{index}", drink_size=0.5,
+                                       price=1.0))
+    db_handle.session.commit()
+    plain = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    for _ in range(2):  # a miss and a hit of the response cache
+        response = client_handle.get('/api/bars/Test-bar/tapdrinks/',
+                                     headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(response.data) < len(plain.data) / 4
+        assert gzip.decompress(response.data) == plain.data
+        assert response.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/Nope/0.5/',
+                                 headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 404
+    assert 'Content-Encoding' not in response.headers
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?stream=true',
+                                 headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['items'] == plain.json['items']
+
+
+def test_precompressed_static_files(client_handle, db_handle):
+    '''
+    Test that the profile and link relation pages are served from their pre-compressed copies, which can be revalidated.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    response = client_handle.get('/profiles/bar/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    static_file = static_files['profiles/bar.html']
+    assert response.data == static_file.variants['gzip']
+    assert gzip.decompress(response.data) == static_file.variants[None]
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    assert response.last_modified is not None
+    response = client_handle.get('/profiles/bar/', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert not response.data
+    response = client_handle.get('/almeta/link-relations/')
+    assert response.mimetype == 'text/html'
+    assert 'Content-Encoding' not in response.headers
+    response = client_handle.get('/almeta/link-relations/', headers={
+        'If-Modified-Since': response.headers['Last-Modified']})
+    assert response.status_code == 304
+    assert client_handle.get('/profiles/wine/').status_code == 404
+
+
+def test_schemas(client_handle, db_handle):
+    '''
+    Test that the controls link to the published schemas, which can be cached and revalidated.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(Bar(name="Test-bar", address="Test-address"))
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/')
+    control = response.json['@controls']['edit-bar']
+    assert 'schema' not in control
+    response = client_handle.get(control['schemaUrl'])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/schema+json'
+    assert response.json == validators.schema(Bar)
+    assert response.cache_control.public
+    assert response.cache_control.max_age >= 24 * 60 * 60
+    response = client_handle.get(control['schemaUrl'],
+                                 headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    for name, model in (('tapdrink', Tapdrink), ('cocktail', Cocktail)):
+        assert client_handle.get(f'/schemas/{name}/').json == validators.schema(model)
+    assert client_handle.get('/schemas/wine/').status_code == 404
+
+
+def test_route_templates(client_handle, db_handle):
+    '''
+    Test that the precompiled route templates build the same URLs as url_for
+    and that the collections link to a template of their items.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    bar = Bar(name="Test-bar", address="Test-address")
+    drink = Tapdrink(bar=bar, drink_name="Karhu III 100%", drink_size=0.33, price=6.5)
+    cocktail = Cocktail(bar=bar, cocktail_name="Sex on the beach?", price=10)
+    db_handle.session.add_all([bar, drink, cocktail])
+    db_handle.session.commit()
+    with app.test_request_context():
+        assert routes.build(BarItem, bar=bar) == api.url_for(BarItem, bar=bar)
+        for resource, values in (
+                (TapdrinkItem, {"drink_name": drink.drink_name, "drink_size": drink.drink_size}),
+                (CocktailItem, {"cocktail_name": cocktail.cocktail_name})):
+            assert routes.build(resource, bar=bar, **values) == api.url_for(resource, bar=bar, **values)
+        assert routes.template(BarItem) == '/api/bars/{bar}/'
+
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    control = response.json['@controls']['almeta:item']
+    assert control['isHrefTemplate']
+    item = response.json['items'][0]
+    href = control['href'].format(drink_name=quote(item['drink_name']), drink_size=item['drink_size'])
+    assert href == item['@controls']['self']['href']
+    assert client_handle.get(href).status_code == 200
+    response = client_handle.get('/api/bars/Test-bar/cocktails/')
+    control = response.json['@controls']['almeta:item']
+    assert control['href'] == '/api/bars/Test-bar/cocktails/{cocktail_name}/'
+    assert client_handle.get(response.json['items'][0]['@controls']['self']['href']).status_code == 200
+    response = client_handle.get('/api/bars/')
+    assert response.json['@controls']['almeta:item']['href'] == '/api/bars/{bar}/'
+
+
+def scrape(client_handle):
+    '''
+    Reads the samples of the /metrics page.
+
+    Args:
+        client_handle: Flask test client.
+
+    Returns:
+        Dict of sample lines to values.
+    '''
+    response = client_handle.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples
+
+
+def test_metrics(client_handle, db_handle):
+    '''
+    Test that requests, their latency, response sizes and SQL statements are exposed on /metrics.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    registry.clear()
+    db_handle.session.add(Bar(name="Test-bar", address="Test-address"))
+    db_handle.session.commit()
+    client_handle.get('/api/bars/Test-bar/')
+    client_handle.get('/api/bars/Test-bar/')
+    client_handle.get('/api/bars/Nowhere/')
+    client_handle.get('/api/nothing/')
+    samples = scrape(client_handle)
+    assert samples['http_requests_total{endpoint="baritem",method="GET",status="200"}'] == 2
+    assert samples['http_requests_total{endpoint="baritem",method="GET",status="404"}'] == 1
+    assert samples['http_requests_total{endpoint="unmatched",method="GET",status="404"}'] == 1
+    assert samples['http_request_duration_seconds_count{endpoint="baritem",method="GET"}'] == 3
+    assert samples['http_request_duration_seconds_bucket{endpoint="baritem",method="GET",le="+Inf"}'] == 3
+    assert samples['http_request_duration_seconds_sum{endpoint="baritem",method="GET"}'] > 0
+    assert samples['http_response_size_bytes_count{endpoint="baritem",method="GET"}'] == 3
+    assert samples['http_request_sql_statements_sum{endpoint="baritem",method="GET"}'] >= 3
+    assert samples['sql_statement_duration_seconds_count'] >= 3
+
+
+def test_metrics_threads(client_handle, db_handle):
+    '''
+    Test that the samples recorded by many threads, also finished ones, are all collected.
+
+    Args:
+        client_handle: Flask test client.
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    test_registry = metrics.Registry()
+    counter = test_registry.counter('test_total', 'Test counter.', ('label',))
+    histogram = test_registry.histogram('test_seconds', 'Test histogram.', (0.1, 1))
+
+    def record():
+        for _ in range(100):
+            counter.inc('a "quoted" value')
+            histogram.observe(0.5)
+
+    for _ in range(test_registry.RETIRE_AFTER + 10):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+    record()
+    text = test_registry.render()
+    assert 'test_total{label="a \\"quoted\\" value"} 7500' in text
+    assert 'test_seconds_bucket{le="0.1"} 0' in text
+    assert 'test_seconds_bucket{le="1"} 7500' in text
+    assert 'test_seconds_count 7500' in text
+    assert len(test_registry._shards) <= test_registry.RETIRE_AFTER
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -10,6 +10,7 @@ from sqlalchemy.engine import Engine
 current = os.path.dirname(os.path.realpath(__file__))  # nopep8
 sys.path.append(os.path.dirname(current))  # nopep8
 
+import app as app_module  # nopep8
 from app import Bar, Cocktail, Tapdrink, app, db  # nopep8
 
 
@@ -497,5 +498,599 @@ def test_cocktailitem_delete(db_handle, client_handle):
     assert new_response.status_code == 404
 
 
+def test_barcollection_get_pages(db_handle, client_handle):
+    '''
+    Test method for walking the "BarCollection" page by page with the next and prev controls.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    for i in range(5):
+        db_handle.session.add(Bar(name=f"Test-bar-{i}", address="Test-address"))
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/?limit=2')
+    assert response.status_code == 200
+    assert [item['name'] for item in response.json['items']] == ['Test-bar-0', 'Test-bar-1']
+    assert 'prev' not in response.json['@controls']
+    response = client_handle.get(response.json['@controls']['next']['href'])
+    assert [item['name'] for item in response.json['items']] == ['Test-bar-2', 'Test-bar-3']
+    last = client_handle.get(response.json['@controls']['next']['href'])
+    assert [item['name'] for item in last.json['items']] == ['Test-bar-4']
+    assert 'next' not in last.json['@controls']
+    response = client_handle.get(last.json['@controls']['prev']['href'])
+    assert [item['name'] for item in response.json['items']] == ['Test-bar-2', 'Test-bar-3']
+
+
+def test_tapdrinkcollection_get_pages(db_handle, client_handle):
+    '''
+    Test method for the paginated GET request of the "TapdrinkCollection".
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    for i in range(3):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{i}"
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?limit=2')
+    assert response.status_code == 200
+    assert len(response.json['items']) == 2
+    response = client_handle.get(response.json['@controls']['next']['href'])
+    assert [item['drink_name'] for item in response.json['items']] == ['Test-tapdrink-2']
+    assert 'next' not in response.json['@controls']
+
+
+def test_cocktailcollection_get_pages(db_handle, client_handle):
+    '''
+    Test method for the paginated GET request of the "CocktailCollection".
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    bar = _create_bar()
+    db_handle.session.add(bar)
+    for i in range(3):
+        cocktail = _create_cocktail()
+        cocktail.cocktail_name = f"Test-cocktail-{i}"
+        db_handle.session.add(cocktail)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/cocktails/?limit=1&after=1')
+    assert response.status_code == 200
+    assert [item['cocktail_name'] for item in response.json['items']] == ['Test-cocktail-1']
+    assert 'next' in response.json['@controls']
+    assert 'prev' in response.json['@controls']
+
+
+def test_barcollection_get_embedded(db_handle, client_handle):
+    '''
+    Test method for the GET request of the "BarCollection" with the menus of the bars embedded.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Bar(name="Test-bar-2", address="Test-address"))
+    db_handle.session.add(_create_tapdrink())
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = client_handle.get('/api/bars/?embed=tapdrinks,cocktails')
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # the ETag version lookup, one query for the bars and one for each embedded collection
+    assert len(statements) == 4
+    first, second = response.json['items']
+    assert first['tapdrinks'][0]['drink_name'] == 'Test-tapdrink'
+    assert first['tapdrinks'][0]['@controls']['self']['href'] == \
+        '/api/bars/Test-bar/tapdrinks/Test-tapdrink/0.5/'
+    assert first['cocktails'][0]['cocktail_name'] == 'Test-cocktail'
+    assert second['tapdrinks'] == []
+    assert 'tapdrinks' not in client_handle.get('/api/bars/').json['items'][0]
+
+
+def test_baritem_get_embedded(db_handle, client_handle):
+    '''
+    Test method for the GET request of a specific bar with its tapdrinks embedded.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(_create_tapdrink())
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/?embed=tapdrinks')
+    assert response.status_code == 200
+    assert response.json['tapdrinks'][0]['price'] == 1.0
+    assert 'cocktails' not in response.json
+
+
+def test_tapdrinkcollection_post_bulk(db_handle, client_handle):
+    '''
+    Test method for the POST request creating several tapdrinks with one INSERT statement.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    docs = [{'bar_name': 'Test-bar', 'drink_type': 'Test-type',
+             'drink_name': f'Test-tapdrink-{i}', 'drink_size': 0.5, 'price': 1.0}
+            for i in range(3)]
+    inserts = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            inserts.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = client_handle.post('/api/bars/Test-bar/tapdrinks/', json=docs)
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert response.status_code == 201
+    assert len(inserts) == 1
+    assert [item['status'] for item in response.json['items']] == [201, 201, 201]
+    assert response.json['items'][2]['@controls']['self']['href'] == \
+        '/api/bars/Test-bar/tapdrinks/Test-tapdrink-2/0.5/'
+    get_response = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    assert len(get_response.json['items']) == 3
+
+
+def test_cocktailcollection_post_bulk(db_handle, client_handle):
+    '''
+    Test method for the POST request creating several cocktails at once.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    response = client_handle.post(
+        '/api/bars/Test-bar/cocktails/',
+        json=[{'bar_name': 'Test-bar', 'cocktail_name': 'Test-cocktail', 'price': 1.0},
+              {'bar_name': 'Test-bar', 'cocktail_name': 'Test-cocktail-2', 'price': 2.0}])
+    assert response.status_code == 201
+    new_response = client_handle.get('/api/bars/Test-bar/cocktails/Test-cocktail-2/')
+    assert new_response.status_code == 200
+    assert new_response.json['price'] == 2.0
+
+
+def test_tapdrinkcollection_get_stream(db_handle, client_handle, monkeypatch):
+    '''
+    Test method for streaming the whole "TapdrinkCollection" in several chunks.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        monkeypatch: pytest monkeypatch fixture.
+
+    Returns:
+        None.
+    '''
+    monkeypatch.setitem(app.config, 'STREAM_BATCH_SIZE', 2)
+    db_handle.session.add(_create_bar())
+    for i in range(5):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{i}"
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    paged = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?stream=true&limit=1')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.json['items'] == paged.json['items']
+    assert response.json['@controls']['self']['href'] == \
+        '/api/bars/Test-bar/tapdrinks/?stream=true&limit=1'
+    assert response.json['@controls']['author'] == paged.json['@controls']['author']
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?stream=true&after=3')
+    assert [item['drink_name'] for item in response.json['items']] == \
+        ['Test-tapdrink-3', 'Test-tapdrink-4']
+
+
+def test_barcollection_get_stream(db_handle, client_handle):
+    '''
+    Test method for streaming the "BarCollection" with embedded menus, and an empty collection.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    response = client_handle.get('/api/bars/?stream=1')
+    assert response.json['items'] == []
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/?stream=1&embed=cocktails')
+    assert response.json['items'][0]['cocktails'][0]['cocktail_name'] == 'Test-cocktail'
+
+
+def test_drinkcollection_get(db_handle, client_handle):
+    '''
+    Test method for ranking the tapdrinks and cocktails of every bar by price.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Bar(name="Other-bar", address="Other-address"))
+    for index, price in enumerate((4.0, 2.0, 6.0)):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        tapdrink.price = price
+        db_handle.session.add(tapdrink)
+    db_handle.session.add(Cocktail(bar_name="Other-bar", cocktail_name="Test-cocktail",
+                                   price=3.0))
+    db_handle.session.commit()
+    response = client_handle.get('/api/drinks/?sort=price&limit=3')
+    assert response.status_code == 200
+    items = response.json['items']
+    assert [item['price'] for item in items] == [2.0, 3.0, 4.0]
+    assert items[1]['cocktail_name'] == 'Test-cocktail'
+    assert items[1]['@controls']['self']['href'] == '/api/bars/Other-bar/cocktails/Test-cocktail/'
+    assert items[0]['drink_name'] == 'Test-tapdrink-1'
+    assert 'prev' not in response.json['@controls']
+    response = client_handle.get(response.json['@controls']['next']['href'])
+    assert [item['price'] for item in response.json['items']] == [6.0]
+    assert 'next' not in response.json['@controls']
+    assert 'offset=0' in response.json['@controls']['prev']['href']
+
+
+def test_drinkcollection_get_by_value(db_handle, client_handle):
+    '''
+    Test method for ranking tapdrinks by price per litre and filtering on it.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    for index, (size, price) in enumerate(((0.5, 4.0), (0.33, 3.0), (0.4, 2.0))):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        tapdrink.drink_size = size
+        tapdrink.price = price
+        db_handle.session.add(tapdrink)
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    response = client_handle.get('/api/drinks/?sort=price_per_litre')
+    items = response.json['items']
+    assert [item['drink_name'] for item in items] == [
+        'Test-tapdrink-2', 'Test-tapdrink-0', 'Test-tapdrink-1']
+    assert items[0]['price_per_litre'] == pytest.approx(5.0)
+    response = client_handle.get('/api/drinks/?sort=price_per_litre&max_price_per_litre=8')
+    assert [item['drink_name'] for item in response.json['items']] == [
+        'Test-tapdrink-2', 'Test-tapdrink-0']
+    # price order is kept, the limit only applies to the tapdrinks
+    for url in ('/api/drinks/?sort=price&max_price_per_litre=8', '/api/drinks/?max_price_per_litre=8'):
+        response = client_handle.get(url)
+        assert [item.get('drink_name', item.get('cocktail_name')) for item in response.json['items']] == [
+            'Test-cocktail', 'Test-tapdrink-2', 'Test-tapdrink-0']
+
+
+def test_searchresults_get(db_handle, client_handle):
+    '''
+    Test method for searching bars, tapdrinks and cocktails by word prefixes.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(_create_tapdrink())
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.add(Bar(name="Karhu pub", address="Test-address"))
+    db_handle.session.commit()
+    response = client_handle.get('/api/search/?q=test-cock')
+    assert response.status_code == 200
+    assert [item['cocktail_name'] for item in response.json['items']] == ['Test-cocktail']
+    # a match in the name ranks above a match in the bar serving the drink
+    response = client_handle.get('/api/search/?q=test-ba')
+    items = response.json['items']
+    assert items[0]['@controls']['self']['href'] == '/api/bars/Test-bar/'
+    assert len(items) == 3
+    # the index follows updates and deletes
+    tapdrink = Tapdrink.query.first()
+    tapdrink.drink_name = "Karhu III"
+    db_handle.session.commit()
+    response = client_handle.get('/api/search/?q=karhu')
+    assert {item.get('drink_name', item.get('name')) for item in response.json['items']} == {
+        'Karhu III', 'Karhu pub'}
+    db_handle.session.delete(tapdrink)
+    db_handle.session.commit()
+    response = client_handle.get('/api/search/?q=karhu')
+    assert [item['name'] for item in response.json['items']] == ['Karhu pub']
+
+
+@pytest.mark.parametrize('url', ['/api/drinks/', '/api/search/?q=test'])
+def test_ranking_skips_deleted_rows(db_handle, client_handle, monkeypatch, url):
+    '''
+    Test that a row deleted between ranking the drinks or searching and loading the rows is left out.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        monkeypatch: pytest monkeypatch fixture.
+        url: URL of the ranked collection.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(_create_tapdrink())
+    db_handle.session.add(_create_cocktail())
+    db_handle.session.commit()
+    load_rows = app_module.load_rows
+
+    def load_rows_after_delete(refs):
+        Tapdrink.query.delete()
+        return load_rows(refs)
+
+    monkeypatch.setattr(app_module, 'load_rows', load_rows_after_delete)
+    # the delete runs within the request
+    for endpoint in ('drinkcollection', 'searchresults'):
+        monkeypatch.setitem(app.config['SQL_BUDGETS'], endpoint, {})
+    response = client_handle.get(url)
+    assert response.status_code == 200
+    assert [item['cocktail_name'] for item in response.json['items']
+            if 'cocktail_name' in item] == ['Test-cocktail']
+    assert not [item for item in response.json['items'] if 'drink_name' in item]
+
+
+def test_tapdrinkcollection_get_filtered_sorted(db_handle, client_handle):
+    '''
+    Test method for filtering and sorting the "TapdrinkCollection", page by page.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    for index, (drink_type, size, price) in enumerate((
+            ("Lager", 0.5, 7.0), ("Cider", 0.5, 6.0), ("Lager", 0.33, 5.0),
+            ("Lager", 0.5, 6.0), ("Lager", 0.5, 9.0))):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        tapdrink.drink_type = drink_type
+        tapdrink.drink_size = size
+        tapdrink.price = price
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    url = '/api/bars/Test-bar/tapdrinks/?drink_type=Lager&max_price=8&sort=-price&limit=2'
+    response = client_handle.get(url)
+    assert response.status_code == 200
+    assert response.json['@controls']['self']['href'] == url
+    assert [item['drink_name'] for item in response.json['items']] == [
+        'Test-tapdrink-0', 'Test-tapdrink-3']
+    next_href = response.json['@controls']['next']['href']
+    assert 'drink_type=Lager' in next_href and 'sort=-price' in next_href
+    response = client_handle.get(next_href)
+    assert [item['drink_name'] for item in response.json['items']] == ['Test-tapdrink-2']
+    assert 'next' not in response.json['@controls']
+    response = client_handle.get(response.json['@controls']['prev']['href'])
+    assert [item['drink_name'] for item in response.json['items']] == [
+        'Test-tapdrink-0', 'Test-tapdrink-3']
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?max_size=0.4&min_price=1')
+    assert [item['drink_name'] for item in response.json['items']] == ['Test-tapdrink-2']
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?sort=name&stream=true')
+    assert [item['drink_name'] for item in response.json['items']] == [
+        f'Test-tapdrink-{index}' for index in range(5)]
+
+
+def test_tapdrinkcollection_get_price_per_litre(db_handle, client_handle):
+    '''
+    Test method for filtering and sorting the "TapdrinkCollection" by price per litre.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    # prices per litre 14, 12, 15.15, 12, 18 and none for the drink without a size
+    for index, (size, price) in enumerate((
+            (0.5, 7.0), (0.5, 6.0), (0.33, 5.0), (0.5, 6.0), (0.5, 9.0), (0, 3.0))):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        tapdrink.drink_size = size
+        tapdrink.price = price
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?sort=price_per_litre&limit=2')
+    assert response.status_code == 200
+    names = [item['drink_name'] for item in response.json['items']]
+    while 'next' in response.json['@controls']:
+        response = client_handle.get(response.json['@controls']['next']['href'])
+        names += [item['drink_name'] for item in response.json['items']]
+    assert names == [f'Test-tapdrink-{index}' for index in (1, 3, 0, 2, 4)]
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?sort=-price_per_litre')
+    assert [item['drink_name'] for item in response.json['items']] == [
+        f'Test-tapdrink-{index}' for index in (4, 2, 0, 3, 1)]
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?max_price_per_litre=14')
+    assert [item['drink_name'] for item in response.json['items']] == [
+        f'Test-tapdrink-{index}' for index in (0, 1, 3)]
+    response = client_handle.get(
+        '/api/bars/Test-bar/tapdrinks/?min_price_per_litre=15&sort=price_per_litre')
+    assert [item['drink_name'] for item in response.json['items']] == [
+        'Test-tapdrink-2', 'Test-tapdrink-4']
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?max_price_per_litre=cheap')
+    assert response.status_code == 400
+    response = client_handle.get('/api/bars/Test-bar/cocktails/?sort=price_per_litre')
+    assert response.status_code == 400
+
+
+def test_cocktailcollection_get_sorted(db_handle, client_handle):
+    '''
+    Test method for sorting the "CocktailCollection" by price and by name.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    for name, price in (("Mojito", 8.0), ("Daiquiri", 9.0), ("Bellini", 7.5)):
+        db_handle.session.add(Cocktail(bar_name="Test-bar", cocktail_name=name, price=price))
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/cocktails/?sort=price')
+    assert [item['cocktail_name'] for item in response.json['items']] == [
+        'Bellini', 'Mojito', 'Daiquiri']
+    response = client_handle.get('/api/bars/Test-bar/cocktails/?sort=-name&limit=1')
+    assert [item['cocktail_name'] for item in response.json['items']] == ['Mojito']
+    response = client_handle.get(response.json['@controls']['next']['href'])
+    assert [item['cocktail_name'] for item in response.json['items']] == ['Daiquiri']
+
+
+def test_stats_get(db_handle, client_handle):
+    '''
+    Test method for the price statistics of a bar and of every bar.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Bar(name="Other-bar", address="Other-address"))
+    for index, (bar_name, drink_type, price) in enumerate((
+            ("Test-bar", "Lager", 4.0), ("Test-bar", "Cider", 6.0),
+            ("Test-bar", "Lager", 8.0), ("Other-bar", "Lager", 3.0))):
+        tapdrink = _create_tapdrink()
+        tapdrink.bar_name = bar_name
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        tapdrink.drink_type = drink_type
+        tapdrink.price = price
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/stats/')
+    assert response.status_code == 200
+    assert response.json['tapdrinks'] == {
+        'count': 3, 'min_price': 4.0, 'avg_price': 6.0, 'median_price': 6.0,
+        'max_price': 8.0, 'by_type': {'Lager': 2, 'Cider': 1}}
+    assert response.json['cocktails']['count'] == 0
+    assert response.json['cocktails']['median_price'] is None
+    response = client_handle.get(response.json['@controls']['almeta:stats-all']['href'])
+    assert response.json['bars'] == 2
+    assert response.json['tapdrinks']['count'] == 4
+    assert response.json['tapdrinks']['median_price'] == 5.0
+    assert response.json['tapdrinks']['by_type'] == {'Lager': 3, 'Cider': 1}
+
+
+def test_lean_representation(db_handle, client_handle, monkeypatch):
+    '''
+    Test method for the lean representation without hypermedia controls.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        monkeypatch: pytest monkeypatch fixture.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    for index in range(3):
+        tapdrink = _create_tapdrink()
+        tapdrink.drink_name = f"Test-tapdrink-{index}"
+        db_handle.session.add(tapdrink)
+    db_handle.session.commit()
+    mason = client_handle.get('/api/bars/Test-bar/tapdrinks/?limit=2')
+    for _ in range(2):  # a miss and a hit of the response cache
+        response = client_handle.get('/api/bars/Test-bar/tapdrinks/?limit=2',
+                                     headers={'Accept': 'application/json'})
+        assert response.mimetype == 'application/json'
+        assert response.json == [
+            {key: value for key, value in item.items() if key != '@controls'}
+            for item in mason.json['items']]
+        assert response.headers['ETag'] != mason.headers['ETag']
+        assert 'Accept' in response.headers['Vary']
+        next_href = mason.json['@controls']['next']['href']
+        assert response.headers['Link'] == f'<{next_href}>; rel="next"'
+    response = client_handle.get('/api/bars/?controls=none&embed=tapdrinks')
+    assert response.json[0]['name'] == 'Test-bar'
+    assert '@controls' not in response.json[0]['tapdrinks'][0]
+    response = client_handle.get('/api/bars/Test-bar/', headers={'Accept': 'application/json'})
+    assert response.json == {'name': 'Test-bar', 'address': 'Test-address'}
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/?stream=true&controls=none')
+    assert [item['drink_name'] for item in response.json] == [
+        f'Test-tapdrink-{index}' for index in range(3)]
+    response = client_handle.get('/api/changes/?controls=none')
+    assert response.json['token'] > 0
+    assert all('@controls' not in item for item in response.json['items'])
+
+    def build_link(*args, **kwargs):
+        raise AssertionError('a lean read built a link')
+
+    # the controls are not built at all, rather than stripped afterwards
+    monkeypatch.setattr(app_module.api, 'url_for', build_link)
+    monkeypatch.setattr(app_module.routes, 'build', build_link)
+    for url in ('/api/bars/?limit=1&embed=cocktails', '/api/bars/Test-bar/?embed=tapdrinks',
+                '/api/bars/Test-bar/tapdrinks/Test-tapdrink-0/0.5/', '/api/bars/Test-bar/stats/',
+                '/api/stats/', '/api/drinks/', '/api/search/?q=test'):
+        response = client_handle.get(url, headers={'Accept': 'application/json'})
+        assert response.status_code == 200
+        assert '@controls' not in response.get_data(as_text=True)
+
+
 if __name__ == '__main__':
     pytest.main(['-v', '-s', __file__])
@@ -0,0 +1,355 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# add parent directory to path to import app (when running tests from root directory)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+from app import Bar, Tapdrink, app, bar_cache, db, response_cache  # nopep8
+
+
+@pytest.fixture
+def db_handle():
+    '''
+    Fixture that sets up a temporary SQLite database for testing purposes using the Flask app and SQLAlchemy.
+
+    Yields:
+        SQLAlchemy database handle.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+    yield db
+
+    db.session.remove()
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def client_handle():
+    '''
+    Fixture that creates a test client for the Flask app.
+
+    Yields:
+        Flask test client.
+    '''
+    client = app.test_client()
+    yield client
+
+
+@pytest.fixture
+def statements():
+    '''
+    Fixture that records every SQL statement sent to the database.
+
+    Yields:
+        List of executed SQL statements.
+    '''
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(Engine, "before_cursor_execute", record)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    '''
+    SQLite pragma listener that enables foreign key support.
+
+    Args:
+        dbapi_connection: Database connection.
+        connection_record: Connection record.
+
+    Returns:
+        None.
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_bar():
+    '''
+    Creates a new bar object for testing purposes.
+
+    Returns:
+        New bar object.
+    '''
+    return Bar(name="Test-bar", address="Test-address")
+
+
+def test_bar_cache_warm_request_runs_no_sql(db_handle, client_handle, statements):
+    '''
+    Tests that a warm bar lookup is served from the bar cache without SQL.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        statements: List of executed SQL statements.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    assert client_handle.get('/api/bars/Test-bar/').status_code == 200
+    statements.clear()
+    response = client_handle.get('/api/bars/Test-bar/')
+    assert response.status_code == 200
+    assert response.json['address'] == 'Test-address'
+    # only the ETag version lookup reaches the database
+    assert len(statements) == 1
+    assert 'FROM version_counter' in statements[0]
+
+
+def test_bar_cache_invalidated_by_put(db_handle, client_handle):
+    '''
+    Tests that renaming a bar invalidates both the old and the new name.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    client_handle.get('/api/bars/Test-bar/')
+    assert bar_cache.get('Test-bar') is not None
+    response = client_handle.put(
+        '/api/bars/Test-bar/', json={'name': 'Test-bar-new', 'address': 'Test-address-new'})
+    assert response.status_code == 204
+    assert bar_cache.get('Test-bar') is None
+    assert client_handle.get('/api/bars/Test-bar/').status_code == 404
+    response = client_handle.get('/api/bars/Test-bar-new/')
+    assert response.json['address'] == 'Test-address-new'
+
+
+def test_bar_cache_invalidated_by_delete(db_handle, client_handle):
+    '''
+    Tests that deleting a cached bar, and with it its drinks, invalidates the cache.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    client_handle.get('/api/bars/Test-bar/')
+    assert client_handle.delete('/api/bars/Test-bar/').status_code == 204
+    assert client_handle.get('/api/bars/Test-bar/').status_code == 404
+    assert bar_cache.get('Test-bar') is None
+    assert Tapdrink.query.count() == 0
+
+
+def test_bar_cache_sees_writes_of_other_processes(db_handle, client_handle):
+    '''
+    Tests that the bar and response caches notice writes made outside the session, like those of another worker.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    assert client_handle.get('/api/bars/Test-bar/').json['address'] == 'Test-address'
+    assert bar_cache.get('Test-bar') is not None
+    path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE bar SET address = 'Moved' WHERE name = 'Test-bar'")
+    response = client_handle.get('/api/bars/Test-bar/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json['address'] == 'Moved'
+    response = client_handle.get('/api/bars/Test-bar/')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.json['address'] == 'Moved'
+    with sqlite3.connect(path) as connection:
+        connection.execute("DELETE FROM bar WHERE name = 'Test-bar'")
+    assert client_handle.get('/api/bars/Test-bar/').status_code == 404
+    assert client_handle.delete('/api/bars/Test-bar/').status_code == 404
+
+
+def test_etag_not_modified(db_handle, client_handle, statements):
+    '''
+    Tests that a matching If-None-Match is answered with 304 without reading any menu rows.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        statements: List of executed SQL statements.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    etag = response.headers['ETag']
+    vary = response.vary
+    statements.clear()
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/',
+                                 headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.vary == vary
+    assert not any('FROM tapdrink' in statement for statement in statements)
+
+
+def test_etag_changes_on_write(db_handle, client_handle):
+    '''
+    Tests that writes to a bar's menu change the ETags of that bar only.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Bar(name="Test-bar-2", address="Test-address"))
+    db_handle.session.commit()
+    bars = client_handle.get('/api/bars/').headers['ETag']
+    bar = client_handle.get('/api/bars/Test-bar/').headers['ETag']
+    other = client_handle.get('/api/bars/Test-bar-2/').headers['ETag']
+    response = client_handle.post(
+        '/api/bars/Test-bar/cocktails/',
+        json=[{'bar_name': 'Test-bar', 'cocktail_name': 'Test-cocktail', 'price': 1.0}])
+    assert response.status_code == 201
+    response = client_handle.get('/api/bars/Test-bar/', headers={'If-None-Match': bar})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != bar
+    response = client_handle.get('/api/bars/Test-bar-2/', headers={'If-None-Match': other})
+    assert response.status_code == 304
+    response = client_handle.get('/api/bars/', headers={'If-None-Match': bars})
+    assert response.status_code == 304
+    client_handle.put('/api/bars/Test-bar-2/', json={'name': 'Test-bar-2', 'address': 'New'})
+    response = client_handle.get('/api/bars/', headers={'If-None-Match': bars})
+    assert response.status_code == 200
+
+
+def test_response_cache_hit(db_handle, client_handle, statements):
+    '''
+    Tests that a repeated GET is served from the response cache without reading any menu rows.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        statements: List of executed SQL statements.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    first = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    assert first.headers['X-Cache'] == 'MISS'
+    statements.clear()
+    hits = response_cache.hits
+    second = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert response_cache.hits == hits + 1
+    assert not any('FROM tapdrink' in statement for statement in statements)
+
+
+def test_response_cache_invalidated_by_writes(db_handle, client_handle):
+    '''
+    Tests that a write evicts the cached responses of the affected bar only.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.add(Bar(name="Other-bar", address="Other-address"))
+    db_handle.session.commit()
+    client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    client_handle.get('/api/bars/Other-bar/tapdrinks/')
+    assert len(response_cache) == 2
+    response = client_handle.post('/api/bars/Test-bar/tapdrinks/', json={
+        'bar_name': 'Test-bar', 'drink_type': 'Test-type', 'drink_name': 'Test-tapdrink',
+        'drink_size': 0.5, 'price': 1.0})
+    assert response.status_code == 201
+    assert len(response_cache) == 1
+    response = client_handle.get('/api/bars/Test-bar/tapdrinks/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(response.json['items']) == 1
+    response = client_handle.get('/api/bars/Other-bar/tapdrinks/')
+    assert response.headers['X-Cache'] == 'HIT'
+
+
+def test_response_cache_stats(db_handle, client_handle):
+    '''
+    Tests that the cache counters are exposed.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    response = client_handle.get('/api/cache/')
+    assert response.status_code == 200
+    for name in ('bars', 'responses'):
+        assert set(response.json[name]) == {'size', 'maxsize', 'hits', 'misses'}
+
+
+def test_stats_cached_until_write(db_handle, client_handle):
+    '''
+    Tests that the statistics are served from the response cache until the menu changes.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    assert client_handle.get('/api/stats/').headers['X-Cache'] == 'MISS'
+    assert client_handle.get('/api/stats/').headers['X-Cache'] == 'HIT'
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    response = client_handle.get('/api/stats/')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json['tapdrinks']['count'] == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,162 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# add parent directory to path to import app (when running tests from root directory)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+from app import Bar, Tapdrink, app, db  # nopep8
+
+
+@pytest.fixture
+def db_handle():
+    '''
+    Fixture that sets up a temporary SQLite database for testing purposes using the Flask app and SQLAlchemy.
+
+    Yields:
+        SQLAlchemy database handle.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+    yield db
+
+    db.session.remove()
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def client_handle():
+    '''
+    Fixture that creates a test client for the Flask app.
+
+    Yields:
+        Flask test client.
+    '''
+    client = app.test_client()
+    yield client
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    '''
+    SQLite pragma listener that enables foreign key support.
+
+    Args:
+        dbapi_connection: Database connection.
+        connection_record: Connection record.
+
+    Returns:
+        None.
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_bar():
+    '''
+    Creates a new bar object for testing purposes.
+
+    Returns:
+        New bar object.
+    '''
+    return Bar(name="Test-bar", address="Test-address")
+
+
+def test_changes_feed_upserts(db_handle, client_handle):
+    '''
+    Tests that created rows are listed in order and the token continues the sync.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    db_handle.session.add(Tapdrink(bar_name="Test-bar", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    response = client_handle.get('/api/changes/?limit=1')
+    assert response.status_code == 200
+    body = response.json
+    assert [item['kind'] for item in body['items']] == ['bar']
+    assert body['items'][0]['operation'] == 'upsert'
+    assert body['items'][0]['data']['name'] == 'Test-bar'
+    assert body['items'][0]['data']['updated_at'] is not None
+    assert body['items'][0]['@controls']['self']['href'] == '/api/bars/Test-bar/'
+    response = client_handle.get(body['@controls']['next']['href'])
+    body = response.json
+    assert [item['kind'] for item in body['items']] == ['tapdrink']
+    assert 'next' not in body['@controls']
+    token = body['token']
+    response = client_handle.get(f'/api/changes/?since={token}')
+    assert response.json['items'] == []
+    assert response.json['token'] == token
+
+
+def test_changes_feed_tombstones(db_handle, client_handle):
+    '''
+    Tests that renames and deletes leave tombstones with the old keys.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    db_handle.session.add(_create_bar())
+    db_handle.session.commit()
+    token = client_handle.get('/api/changes/').json['token']
+    response = client_handle.put(
+        '/api/bars/Test-bar/', json={'name': 'Test-bar-new', 'address': 'Test-address'})
+    assert response.status_code == 204
+    items = client_handle.get(f'/api/changes/?since={token}').json['items']
+    deleted = [item['data'] for item in items if item['operation'] == 'delete']
+    assert {'name': 'Test-bar'} in deleted
+    upserted = [item['data'] for item in items if item['operation'] == 'upsert']
+    assert any(data.get('name') == 'Test-bar-new' for data in upserted)
+    db_handle.session.add(Tapdrink(bar_name="Test-bar-new", drink_type="Test-type",
+                                   drink_name="Test-tapdrink", drink_size=0.5, price=1.0))
+    db_handle.session.commit()
+    token = client_handle.get('/api/changes/').json['token']
+    assert client_handle.delete('/api/bars/Test-bar-new/').status_code == 204
+    items = client_handle.get(f'/api/changes/?since={token}').json['items']
+    assert {(item['kind'], item['operation']) for item in items} == {
+        ('bar', 'delete'), ('tapdrink', 'delete')}
+    tapdrink = next(item for item in items if item['kind'] == 'tapdrink')
+    assert tapdrink['data'] == {'bar_name': 'Test-bar-new', 'drink_name': 'Test-tapdrink',
+                                'drink_size': 0.5}
+
+
+def test_changes_feed_invalid_token(db_handle, client_handle):
+    '''
+    Tests that a malformed sync token is rejected.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    response = client_handle.get('/api/changes/?since=abc')
+    assert response.status_code == 400
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# add parent directory to path to import app (when running tests from root directory)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+import importer  # nopep8
+from app import Bar, Tapdrink, app, db  # nopep8
+
+
+@pytest.fixture
+def db_handle():
+    '''
+    Fixture that sets up a temporary SQLite database for testing purposes using the Flask app and SQLAlchemy.
+
+    Yields:
+        SQLAlchemy database handle.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+    yield db
+
+    db.session.remove()
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def data_dir():
+    '''
+    Fixture that provides a temporary directory for the import files.
+
+    Yields:
+        Path to the directory.
+    '''
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    '''
+    SQLite pragma listener that enables foreign key support.
+
+    Args:
+        dbapi_connection: Database connection.
+        connection_record: Connection record.
+
+    Returns:
+        None.
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _write(path, text):
+    '''
+    Writes an import file.
+
+    Returns:
+        The path of the file.
+    '''
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(text)
+    return path
+
+
+def test_import_bars_and_tapdrinks(db_handle, data_dir):
+    '''
+    Tests importing bars from CSV and their tapdrinks from NDJSON with the flask CLI.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        data_dir: Directory for the import files.
+
+    Returns:
+        None.
+    '''
+    bars = _write(os.path.join(data_dir, 'bars.csv'),
+                  'name,address\nTest-bar,Test-address\nTest-bar-2,Test-address-2\n')
+    tapdrinks = _write(os.path.join(data_dir, 'tapdrinks.ndjson'), '\n'.join(
+        json.dumps({'bar_name': 'Test-bar', 'drink_name': f'Test-tapdrink-{i}',
+                    'drink_size': 0.5, 'price': 1.0 + i}) for i in range(5)))
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import-data', 'bars', bars])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(args=['import-data', 'tapdrinks', tapdrinks, '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert '5 rows processed' in result.output
+    assert not os.path.exists(tapdrinks + '.checkpoint')
+    with app.app_context():
+        assert Bar.query.count() == 2
+        assert Tapdrink.query.filter_by(drink_name='Test-tapdrink-4').one().price == 5.0
+
+
+def test_import_reports_invalid_rows(db_handle, data_dir):
+    '''
+    Tests that rows failing the JSON schema are skipped and reported with their line numbers.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        data_dir: Directory for the import files.
+
+    Returns:
+        None.
+    '''
+    bars = _write(os.path.join(data_dir, 'bars.csv'),
+                  'name,address\nTest-bar,Test-address\nTest-bar-2,\n')
+    result = app.test_cli_runner().invoke(args=['import-data', 'bars', bars])
+    assert result.exit_code == 1
+    assert 'line 3' in result.output
+    with app.app_context():
+        assert Bar.query.count() == 1
+
+
+def test_import_resumes_from_checkpoint(db_handle, data_dir):
+    '''
+    Tests that a failed import continues after the last committed batch.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        data_dir: Directory for the import files.
+
+    Returns:
+        None.
+    '''
+    path = _write(os.path.join(data_dir, 'bars.ndjson'), '\n'.join(
+        json.dumps({'name': name, 'address': 'Test-address'})
+        for name in ['Test-bar-1', 'Test-bar-2', 'Test-bar-1', 'Test-bar-3']))
+    checkpoint = path + '.checkpoint'
+    with app.app_context():
+        with pytest.raises(importer.ImportFailed):
+            importer.import_file(db.session, Bar, path, batch_size=2, checkpoint=checkpoint)
+        assert importer.read_checkpoint(checkpoint) == 2
+        assert Bar.query.count() == 2
+        stats = importer.import_file(db.session, Bar, path, batch_size=2,
+                                     checkpoint=checkpoint, on_conflict='ignore')
+        assert stats['skipped'] == 2
+        assert stats['imported'] == 1
+        assert Bar.query.count() == 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# add parent directory to path to import app (when running tests from root directory)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+import migrations  # nopep8
+from app import Bar, app, db, hot_queries  # nopep8
+
+
+@pytest.fixture
+def db_handle():
+    '''
+    Fixture that sets up a temporary SQLite database for testing purposes using the Flask app and SQLAlchemy.
+
+    Yields:
+        SQLAlchemy database handle.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+    yield db
+
+    db.session.remove()
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def legacy_db_path():
+    '''
+    Fixture that creates a database file with the original, index-less schema.
+
+    Yields:
+        Path to the database file.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    connection = sqlite3.connect(db_path)
+    connection.executescript('''
+        CREATE TABLE bar (
+            id INTEGER NOT NULL, name VARCHAR(64) NOT NULL, address VARCHAR(64),
+            PRIMARY KEY (id), UNIQUE (name));
+        CREATE TABLE tapdrink (
+            id INTEGER NOT NULL, bar_name VARCHAR(64), drink_type VARCHAR(64),
+            drink_name VARCHAR(64) NOT NULL, drink_size FLOAT NOT NULL,
+            price FLOAT NOT NULL, PRIMARY KEY (id),
+            FOREIGN KEY(bar_name) REFERENCES bar (name) ON DELETE CASCADE);
+        CREATE TABLE cocktail (
+            id INTEGER NOT NULL, bar_name VARCHAR(64),
+            cocktail_name VARCHAR(64) NOT NULL, price FLOAT NOT NULL,
+            PRIMARY KEY (id),
+            FOREIGN KEY(bar_name) REFERENCES bar (name) ON DELETE CASCADE);
+        INSERT INTO bar (name, address) VALUES ('Test-bar', 'Test-address');
+        INSERT INTO tapdrink (bar_name, drink_type, drink_name, drink_size, price)
+            VALUES ('Test-bar', 'Test-type', 'Test-tapdrink', 0.5, 1.0);
+    ''')
+    connection.close()
+
+    yield db_path
+
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    '''
+    SQLite pragma listener that enables foreign key support.
+
+    Args:
+        dbapi_connection: Database connection.
+        connection_record: Connection record.
+
+    Returns:
+        None.
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def test_upgrade_legacy_database(legacy_db_path):
+    '''
+    Tests that an existing database is upgraded in place and keeps its rows.
+
+    Args:
+        legacy_db_path: Path to a database with the original schema.
+
+    Returns:
+        None.
+    '''
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + legacy_db_path
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+    assert result.exit_code == 0
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert migrations.current_version(
+                connection) == migrations.latest_version()
+            indexes = connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'").scalars().all()
+            assert 'ix_tapdrink_lookup' in indexes
+            assert 'ix_cocktail_lookup' in indexes
+            assert connection.exec_driver_sql(
+                "SELECT COUNT(*) FROM tapdrink").scalar() == 1
+            assert connection.exec_driver_sql(
+                "SELECT price_per_litre FROM tapdrink").scalar() == 2.0
+        # a second run has nothing left to do
+        assert migrations.upgrade(db.engine) == []
+
+
+def test_hot_queries_use_indexes(db_handle):
+    '''
+    Tests with EXPLAIN QUERY PLAN that every hot query of the resources is served by an index.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    with app.app_context():
+        migrations.upgrade(db_handle.engine)
+        with db_handle.engine.connect() as connection:
+            assert migrations.check_query_plans(
+                connection, hot_queries()) == {}
+
+
+def test_check_query_plans_reports_scans(db_handle):
+    '''
+    Tests that a query without a usable index is reported.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+
+    Returns:
+        None.
+    '''
+    with app.app_context():
+        with db_handle.engine.connect() as connection:
+            failures = migrations.check_query_plans(
+                connection, {'by address': Bar.query.filter_by(address='').statement})
+    assert 'by address' in failures
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,178 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# add parent directory to path to import app (when running tests from root directory)
+current = os.path.dirname(os.path.realpath(__file__))  # nopep8
+sys.path.append(os.path.dirname(current))  # nopep8
+
+import app as app_module  # nopep8
+from flask import g, request  # nopep8
+from app import Bar, Cocktail, QueryBudgetExceeded, Tapdrink, app, db  # nopep8
+
+
+@pytest.fixture
+def db_handle():
+    '''
+    Fixture that sets up a temporary SQLite database for testing purposes using the Flask app and SQLAlchemy.
+
+    Yields:
+        SQLAlchemy database handle.
+    '''
+    db_df, db_path = tempfile.mkstemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+
+    yield db
+
+    db.session.remove()
+    os.close(db_df)
+    os.unlink(db_path)
+
+
+@pytest.fixture
+def client_handle():
+    '''
+    Fixture that creates a test client for the Flask app.
+
+    Yields:
+        Flask test client.
+    '''
+    client = app.test_client()
+    yield client
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    '''
+    SQLite pragma listener that enables foreign key support.
+
+    Args:
+        dbapi_connection: Database connection.
+        connection_record: Connection record.
+
+    Returns:
+        None.
+    '''
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+URLS = [
+    '/api/bars/',
+    '/api/bars/?embed=tapdrinks,cocktails',
+    '/api/bars/?stream=true',
+    '/api/bars/Bar-0/',
+    '/api/bars/Bar-0/?embed=tapdrinks,cocktails',
+    '/api/bars/Bar-0/tapdrinks/',
+    '/api/bars/Bar-0/tapdrinks/?sort=-price&min_price=1',
+    '/api/bars/Bar-0/tapdrinks/Drink-1/0.5/',
+    '/api/bars/Bar-0/cocktails/',
+    '/api/bars/Bar-0/cocktails/Cocktail-1/',
+    '/api/bars/Bar-0/stats/',
+    '/api/drinks/',
+    '/api/drinks/?sort=price_per_litre',
+    '/api/stats/',
+    '/api/search/?q=Drink',
+    '/api/changes/',
+]
+
+
+def _populate(db_handle, bars=5, items=30):
+    '''
+    Adds bars with enough drinks and cocktails that a query run per row would break the budgets.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        bars: Number of bars.
+        items: Number of drinks and of cocktails per bar.
+
+    Returns:
+        None.
+    '''
+    for number in range(bars):
+        bar = Bar(name=f"Bar-{number}", address="Test-address")
+        db_handle.session.add(bar)
+        for item in range(items):
+            db_handle.session.add(Tapdrink(bar=bar, drink_name=f"Drink-{item}", drink_size=0.5,
+                                           drink_type="beer", price=5 + item))
+            db_handle.session.add(Cocktail(bar=bar, cocktail_name=f"Cocktail-{item}", price=9 + item))
+    db_handle.session.commit()
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_read_budgets(db_handle, client_handle, url):
+    '''
+    Tests that reading a large catalogue stays within the SQL budget of every endpoint and repeats no statement.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        url: URL to read.
+
+    Returns:
+        None.
+    '''
+    _populate(db_handle)
+    with client_handle:
+        response = client_handle.get(url)
+        assert response.status_code == 200
+        budget = app.config['SQL_BUDGETS'][request.endpoint]['GET']
+        assert 0 < g.sql_statements <= budget
+        assert max(g.sql_shapes.values()) < app.config['SQL_REPEAT_THRESHOLD']
+
+
+def test_write_budgets(db_handle, client_handle):
+    '''
+    Tests that bulk creation and deletion of a bar with a large menu stay within the SQL budgets.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+
+    Returns:
+        None.
+    '''
+    _populate(db_handle, bars=1)
+    docs = [{"drink_name": f"Bulk-{item}", "drink_size": 0.33, "drink_type": "beer", "price": 4,
+             "bar_name": "Bar-0"} for item in range(50)]
+    assert client_handle.post('/api/bars/Bar-0/tapdrinks/', json=docs).status_code == 201
+    assert client_handle.delete('/api/bars/Bar-0/').status_code == 204
+
+
+def test_budget_exceeded(db_handle, client_handle, monkeypatch, caplog):
+    '''
+    Tests that a query run for every item of a collection is logged and breaks the budget.
+
+    Args:
+        db_handle: SQLAlchemy database handle.
+        client_handle: Flask test client.
+        monkeypatch: pytest monkeypatch fixture.
+        caplog: pytest log capture fixture.
+
+    Returns:
+        None.
+    '''
+    _populate(db_handle, bars=1, items=10)
+    tapdrink_item = app_module.tapdrink_item
+
+    def lookup_per_item(bar, tapdrink):
+        db.session.query(Bar).filter(Bar.name == tapdrink.bar_name).one()
+        return tapdrink_item(bar, tapdrink)
+
+    monkeypatch.setattr(app_module, 'tapdrink_item', lookup_per_item)
+    with pytest.raises(QueryBudgetExceeded):
+        client_handle.get('/api/bars/Bar-0/tapdrinks/')
+    assert 'Possible N+1 query in GET tapdrinkcollection, statement run 10 times' in caplog.text
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])